@@ -1,32 +1,46 @@
-from fastapi import FastAPI, Query
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from langchain.chat_models import ChatOllama
-import sqlite3
-from fuzzywuzzy import fuzz
-# run cml : uvicorn samples_langchain.7_0_simple_fastapi:app --reload
+from langchain_api_cache import LRUTTLCache, normalize_question
+from langchain_api_embeddings import EmbeddingIndexError, get_embedder, get_embedding_index, semantic_search
+from langchain_api_keyword_index import rank_resources
+from langchain_api_llm import get_llm_pool
+from langchain_api_metrics import count, format_server_timing, metrics, span, start_request_stages
+from langchain_api_resource_snapshot import ResourceSnapshot, SchemaVersionError, get_resource_snapshot
+# run cml : uvicorn gpts_langchain_assistance_api:create_app --factory --reload
 # http://127.0.0.1:8000/docs
 # http://127.0.0.1:8000/quote
 # distribute : cloudflared tunnel --url http://127.0.0.1:8000
 # note : install cml for cloudflared is "winget install --id Cloudflare.cloudflared" refer to homepage 
 
-criteria_rate = 0.01
+top_k = 5   # semantic mode result count
+search_beam_width = int(os.environ.get("SEARCH_BEAM_WIDTH", "5"))       # 루트/자식 목록마다 frontier에 넣을 최대 노드 수
+search_result_limit = int(os.environ.get("SEARCH_RESULT_LIMIT", "20"))  # 반환할 최대 url 수
+search_budget = float(os.environ.get("SEARCH_BUDGET", "0.5"))           # tree search 시간 예산(초). 넘으면 그때까지의 결과를 반환
+search_max_concurrency = int(os.environ.get("SEARCH_MAX_CONCURRENCY", "8"))   # 동시에 실행할 검색 스레드 수
+search_timeout = float(os.environ.get("SEARCH_TIMEOUT", "10"))                  # 검색 1회의 최대 대기 시간(초)
+# 검색 전용 스레드 풀. 타임아웃으로 응답을 포기한 검색도 끝날 때까지 스레드를 차지하므로 실제 동시 실행 수가 이 값을 넘지 않는다
+search_executor = ThreadPoolExecutor(max_workers=search_max_concurrency, thread_name_prefix="search")
+keyword_cache_size = int(os.environ.get("KEYWORD_CACHE_SIZE", "4096"))
+keyword_cache_ttl = float(os.environ.get("KEYWORD_CACHE_TTL", "86400"))
+keyword_cache_db = os.environ.get("KEYWORD_CACHE_DB", "langchain_api_cache.db")   # 빈 문자열이면 메모리 캐시만 사용
+local_keyword_confidence = float(os.environ.get("LOCAL_KEYWORD_CONFIDENCE", "0.6"))  # auto 모드에서 이 값 이상이면 LLM을 호출하지 않음
+warm_up_components = os.environ.get("WARM_UP", "")  # startup 때 미리 준비할 것 (콤마 구분) : snapshot, keyword_cache, llm, embeddings
 
-app = FastAPI(
-    title="Langchain API Assistant",
-    description="Langchain API Assistant. if you want to use langchain api, please refer to this api.",
-)
-
-def is_similar(str1, str2):
-    threshold=40
-    """
-    두 문자열의 유사도를 계산하여 threshold 값 이상이면 True를 반환
-    :param str1: 첫 번째 문자열
-    :param str2: 두 번째 문자열
-    :param threshold: 유사도 임계값 (0~100)
-    :return: bool 값으로 유사 여부 반환
-    """
-    similarity_score = fuzz.ratio(str1, str2)
-    return similarity_score >= threshold
+keyword_cache = None
+keyword_cache_lock = threading.Lock()
+keyword_inflight = {}   # normalized question -> keyword generation task shared by concurrent requests
 
 class question_answer(BaseModel):
     answer: str = Field(
@@ -47,20 +61,45 @@ class question_answer(BaseModel):
 #     response_model=question_answer,
 # )
 
-def gen_keywords(question: str)->list[str]:
-    llm = ChatOllama(
-        model="mistral",
-        temperature=0.1,
-        device = "device",
-        # 생성 부분 추가
-        generation_kwargs={
-            "max_tokens": 4096,                 #max_tokens: 생성할 최대 토큰 수를 4096으로 설정합니다.
-            "top_p": 0.95,                      #top_p: 누적 확률 분포에서 상위 95%의 토큰만 고려합니다.
-            "top_k": 50,                        #top_k: 각 단계에서 가장 가능성 있는 50개의 토큰만 고려합니다.
-            "repeat_penalty": 1.1,              #repeat_penalty: 반복을 피하기 위해 이미 생성된 토큰에 1.1의 페널티를 적용합니다.
-            "stop": ["[INST]", "[/INST]"],      #stop: "[INST]"와 "[/INST]"를 만나면 생성을 중지합니다.
-        }
-    )
+def get_keyword_cache() -> LRUTTLCache:
+    global keyword_cache
+    if keyword_cache is None:
+        with keyword_cache_lock:
+            if keyword_cache is None:
+                keyword_cache = LRUTTLCache(keyword_cache_size, keyword_cache_ttl, keyword_cache_db or None, table="keyword_cache")
+    return keyword_cache
+
+def gen_keywords_local(question: str)->tuple[list[str], float]:
+    return get_resource_snapshot().local_keywords(question)
+
+async def gen_keywords(question: str, keyword_mode: str = "auto")->list[str]:
+    # auto: 질문 단어가 키워드 어휘와 충분히 맞으면 local 결과를 쓰고, 아니면 LLM
+    if keyword_mode != "llm":
+        with span("keywords_local"):
+            keywords, confidence = await asyncio.to_thread(gen_keywords_local, question)
+        if keyword_mode == "local" or (keywords and confidence >= local_keyword_confidence):
+            count("keyword_requests_total", source="local")
+            return keywords
+    key = normalize_question(question)
+    keywords = await asyncio.to_thread(get_keyword_cache().get, key)
+    if keywords is not None:
+        count("keyword_requests_total", source="cache")
+        return keywords
+    # task는 span 안에서 만들어야 그 안의 llm stage가 keywords_llm에 포함된 것으로 기록된다
+    with span("keywords_llm"):
+        task = keyword_inflight.get(key)
+        if task is None:
+            count("keyword_requests_total", source="llm")
+            task = asyncio.ensure_future(gen_keywords_llm(question))
+            keyword_inflight[key] = task
+            task.add_done_callback(lambda _: keyword_inflight.pop(key, None))
+        else:
+            count("keyword_requests_total", source="inflight")
+        keywords = await asyncio.shield(task)
+    await asyncio.to_thread(get_keyword_cache().set, key, keywords)
+    return keywords
+
+async def gen_keywords_llm(question: str)->list[str]:
     prompt = f"""[INST]
     You are a professional programmer's assistant. Please extract keywords based on the given content. at least 10 keywords.
     FOLLOW THIS FORMAT : keyword1, keyword2, keyword3
@@ -68,62 +107,193 @@ def gen_keywords(question: str)->list[str]:
     
     {question}. It is about langchain api.
     [/INST]"""    
-    keywords = llm.invoke(prompt).content
+    keywords = await get_llm_pool().ainvoke(prompt)
     return keywords.split(',')
     
-def search_target_urls(question: str, keywords: list[str], depth: int = 1)-> list[str]:        
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, keywords FROM langchain_api_resource WHERE depth = ?", (depth,))
-    results = cursor.fetchall()
-    conn.close()
-    keywords_len = len(keywords)
-    max_match_rate = criteria_rate
-    bucket_id = []
-    bucket_url = []
-    for id, keywords_db in results:
-        if keywords_db is '' or keywords_db is None:
-            continue
-        match_count = sum(1 for keyword in keywords if is_similar(keyword, keywords_db))
-        match_rate = match_count / keywords_len
-        if match_rate > max_match_rate:
-            max_match_rate = match_rate
-            bucket_id.clear
-            bucket_id.append(id)
-        elif match_rate == max_match_rate:
-            bucket_id.append(id)
-    # if child_id none, finish search
-    for id in bucket_id:
-        conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-        cursor = conn.cursor()
-        cursor.execute("SELECT url, children_ids FROM langchain_api_resource WHERE id = ?", (id,))
-        url, children_ids = cursor.fetchone()
-        conn.close()
-        bucket_url.append(url)
-        if children_ids is not None:
-            urls = search_target_urls(question, keywords, depth+1)
-            bucket_url.append(urls)
-
-    return bucket_url
-
-@app.get("/question_answer")
-async def question_answer(question: str = Query(..., description="The question to be answered")):
-    keywords = gen_keywords(question)
-    urls = search_target_urls(question, keywords)
-    print(urls)
+def iter_search_results(keywords: list[str], snapshot: ResourceSnapshot = None, beam_width: int = None,
+                        limit: int = None, budget: float = None):
+    """
+    parent -> children 트리에 대한 best-first 검색. 점수가 가장 높은 노드부터 꺼내 결과로 내보내고,
+    그 노드의 자식만 점수를 매겨 상위 beam_width 개를 frontier에 넣는다.
+    :return: generator of (position, score), 점수가 높은 노드부터 (중복 없음)
+    """
+    if snapshot is None:
+        snapshot = get_resource_snapshot()
+    beam_width = beam_width or search_beam_width
+    limit = limit or search_result_limit
+    deadline = time.monotonic() + (search_budget if budget is None else budget)
+    # fuzzy scoring only for rows sharing trigrams with the question keywords
+    roots = rank_resources(keywords, snapshot.candidates(keywords, 1), beam_width)
+    if not roots:
+        roots = rank_resources(keywords, snapshot.candidates(keywords), beam_width)
+    order = itertools.count()
+    frontier = [(-score, next(order), i) for i, score in roots]
+    heapq.heapify(frontier)
+    seen = {i for i, score in roots}
+    returned = 0
+    while frontier and returned < limit:
+        score, _, i = heapq.heappop(frontier)
+        yield i, -score
+        returned += 1
+        if time.monotonic() > deadline:
+            return
+        children = [child for child in snapshot.children[i] if child not in seen]
+        for child, child_score in rank_resources(keywords, snapshot.resource_keywords(children), beam_width):
+            seen.add(child)
+            heapq.heappush(frontier, (-child_score, next(order), child))
+
+def search_target_urls(question: str, keywords: list[str], snapshot: ResourceSnapshot = None, **search_options)-> list[tuple[str, float]]:
+    # the whole search reads one in-memory snapshot, no db i/o
+    # :return: [(url, score)] flat, deduplicated
+    if snapshot is None:
+        snapshot = get_resource_snapshot()
+    return [(snapshot.urls[i], score) for i, score in iter_search_results(keywords, snapshot, **search_options)]
+
+def take_search_results(results, snapshot: ResourceSnapshot, limit: int)-> list[tuple[str, float]]:
+    return [(snapshot.urls[i], score) for i, score in itertools.islice(results, limit)]
+
+def format_urls(urls: list[tuple[str, float]])-> str:
+    return ", ".join(f"{i}. {url}" for i, (url, score) in enumerate(urls, 1))
+
+def search_semantic_urls(question: str, snapshot: ResourceSnapshot = None)-> list[str]:
+    # embedding top-k over description + keywords, no LLM keyword generation
+    if snapshot is None:
+        snapshot = get_resource_snapshot()
+    return [(snapshot.urls[snapshot.position[id]], score) for id, score in semantic_search(question, top_k) if id in snapshot.position]
+
+async def run_search(search, *args)-> list[tuple[str, float]]:
+    # snapshot reload and scoring are blocking, keep them off the event loop
+    # 대기 중에 타임아웃 나면 시작 전 작업은 취소된다. context는 요청별 stage 기록(metrics)을 위해 span 안에서 복사
+    with span("search"):
+        future = search_executor.submit(contextvars.copy_context().run, search, *args)
+        return await asyncio.wait_for(asyncio.wrap_future(future), search_timeout)
+
+async def record_request_stages(request: Request, call_next):
+    # X-Debug-Timing 요청 헤더가 있으면 stage별 소요 시간을 Server-Timing 응답 헤더로 돌려준다
+    # (streaming 응답은 헤더가 먼저 나가므로 keyword 단계까지만 포함)
+    stages = start_request_stages()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    # 라벨은 route 경로로 고정한다. 요청 경로를 그대로 쓰면 404 경로마다 series가 생긴다
+    route = request.scope.get("route")
+    path = route.path if route is not None else "other"
+    metrics.observe("request_seconds", elapsed, path=path)
+    count("requests_total", path=path, status=response.status_code)
+    if request.headers.get("x-debug-timing"):
+        response.headers["Server-Timing"] = format_server_timing({**stages, "total": elapsed})
+    return response
+
+def get_metrics():
+    for name, value in get_keyword_cache().stats().items():
+        metrics.set("keyword_cache", value, stat=name)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def warm_up(components: str = "snapshot,keyword_cache,llm,embeddings"):
+    # 첫 요청이 초기화 비용을 내지 않도록 미리 만들어 둔다. 기본은 모두 lazy (WARM_UP 환경 변수로 startup 때 선택)
+    components = {component.strip() for component in components.split(",")}
+    if "snapshot" in components:
+        get_resource_snapshot()
+    if "keyword_cache" in components:
+        get_keyword_cache()
+    if "llm" in components:
+        get_llm_pool()
+    if "embeddings" in components:
+        get_embedder()
+        try:
+            get_embedding_index()
+        except EmbeddingIndexError:
+            pass
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if warm_up_components:
+        await asyncio.to_thread(warm_up, warm_up_components)
+    yield
+
+async def question_answer(
+    question: str = Query(..., description="The question to be answered"),
+    mode: Literal["keyword", "semantic"] = Query("keyword", description="keyword: LLM keywords + fuzzy tree search, semantic: embedding similarity"),
+    keyword_mode: Literal["auto", "local", "llm"] = Query("auto", description="auto: local vocabulary match, LLM only when confidence is low"),
+):
+    try:
+        if mode == "semantic":
+            urls = await run_search(search_semantic_urls, question)
+        else:
+            keywords = await gen_keywords(question, keyword_mode)
+            urls = await run_search(search_target_urls, question, keywords)
+    except asyncio.TimeoutError:
+        count("search_timeouts_total", mode=mode)
+        raise HTTPException(status_code=504, detail="keyword generation or search timed out")
+    count("search_results_total", len(urls), mode=mode)
     return {
         "answer": f"{question} is answered",
-        "urls": "1. https://www.google.com, 2. https://www.naver.com",
+        "urls": format_urls(urls),
     }
     # return question_answer(question)
 
-# test
-question = "UsageMetadata sample code"
-keywords = gen_keywords(question)
-print(keywords)
-urls = search_target_urls(question, keywords, 2)
-print(urls)
+async def stream_question_answer(question: str, mode: str, keyword_mode: str):
+    # event dict를 best-first 검색 결과 search_beam_width 개마다 내보낸다
+    urls = []
+    try:
+        if mode == "semantic":
+            urls = await run_search(search_semantic_urls, question)
+            yield {"event": "urls", "urls": [{"url": url, "score": score} for url, score in urls]}
+        else:
+            # /question_answer와 같이 키워드 생성은 LLM pool의 llm_timeout만 적용된다
+            keywords = await gen_keywords(question, keyword_mode)
+            yield {"event": "keywords", "keywords": keywords}
+            snapshot = await asyncio.to_thread(get_resource_snapshot)
+            results = iter_search_results(keywords, snapshot)
+            while True:
+                batch = await run_search(take_search_results, results, snapshot, search_beam_width)
+                if not batch:
+                    break
+                urls.extend(batch)
+                yield {"event": "urls", "urls": [{"url": url, "score": score} for url, score in batch]}
+    except asyncio.TimeoutError:
+        count("search_timeouts_total", mode=mode)
+        yield {"event": "error", "detail": "keyword generation or search timed out"}
+    except Exception as e:
+        # 응답이 이미 시작되어 status code를 바꿀 수 없으므로 연결을 끊지 않고 error event로 알린다
+        yield {"event": "error", "detail": str(e)}
+    yield {"event": "done", "answer": f"{question} is answered", "urls": format_urls(urls)}
+
+async def question_answer_stream(
+    question: str = Query(..., description="The question to be answered"),
+    mode: Literal["keyword", "semantic"] = Query("keyword", description="keyword: LLM keywords + fuzzy tree search, semantic: embedding similarity"),
+    keyword_mode: Literal["auto", "local", "llm"] = Query("auto", description="auto: local vocabulary match, LLM only when confidence is low"),
+    format: Literal["ndjson", "sse"] = Query("ndjson", description="ndjson: one JSON object per line, sse: text/event-stream"),
+):
+    async def body():
+        async for event in stream_question_answer(question, mode, keyword_mode):
+            if format == "sse":
+                yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            else:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def service_unavailable(request: Request, error: Exception):
+    return JSONResponse(status_code=503, content={"detail": str(error)})
+
+def create_app() -> FastAPI:
+    # import에는 부작용이 없고, LLM / snapshot / 캐시는 첫 사용 또는 warm_up 때 만들어진다
+    app = FastAPI(
+        title="Langchain API Assistant",
+        description="Langchain API Assistant. if you want to use langchain api, please refer to this api.",
+        lifespan=lifespan,
+    )
+    app.middleware("http")(record_request_stages)
+    app.add_exception_handler(SchemaVersionError, service_unavailable)
+    app.add_exception_handler(EmbeddingIndexError, service_unavailable)
+    app.add_api_route("/question_answer", question_answer, methods=["GET"])
+    app.add_api_route("/question_answer/stream", question_answer_stream, methods=["GET"])
+    app.add_api_route("/metrics", get_metrics, methods=["GET"], response_class=PlainTextResponse)
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("gpts_langchain_assistance_api:create_app", factory=True, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
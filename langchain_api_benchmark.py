@@ -0,0 +1,318 @@
+"""
+오프라인 벤치마크. 합성 langchain_api_resource db와 stub LLM으로 검색, API, 크롤러의 처리량과 지연 시간을 잰다.
+크롤러는 링크된 fixture 사이트를 frontier 워커 프로세스로 끝까지 크롤링한다 (파싱, enrichment, db 쓰기 포함).
+결과는 JSON으로 출력되어 실행 간 비교할 수 있다.
+
+python langchain_api_benchmark.py --rows 100000 --output bench_100k.json
+python langchain_api_benchmark.py --skip search api --crawl-workers 4 --crawl-llm-latency 1
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import queue
+import random
+import sqlite3
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+name_parts = ["Chat", "Ollama", "Vector", "Store", "Retriever", "Usage", "Metadata", "Message", "Tool", "Call",
+              "Output", "Parser", "Prompt", "Template", "Embedding", "Document", "Loader", "Text", "Splitter",
+              "Runnable", "Callback", "Handler", "Memory", "Agent", "Executor", "Cache", "Index", "Graph", "Query",
+              "Stream", "Chunk", "Token", "Model", "Config", "Schema", "Json", "Sql", "Http", "Search", "Summary"]
+question_suffixes = ["sample code", "example", "how to use", "parameters", "return value", ""]
+
+
+def percentiles(latencies: list[float]) -> dict:
+    # 초 단위 지연 시간 목록 -> ms 단위 요약
+    if not latencies:
+        return {"count": 0}
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "mean_ms": float(values.mean()), "p50_ms": float(p50), "p95_ms": float(p95),
+            "p99_ms": float(p99), "max_ms": float(values.max())}
+
+
+def level_sizes(rows: int) -> list[int]:
+    # depth 1 category -> 2 sub category -> 3 class/function -> 4 method, 아래로 갈수록 fan-out이 커진다
+    sizes = [max(5, rows // 2000), max(20, rows // 200), max(100, rows // 20)]
+    sizes.append(max(0, rows - sum(sizes)))
+    return sizes
+
+
+def resource_name(rng: random.Random) -> str:
+    return "".join(rng.sample(name_parts, rng.randint(2, 3)))
+
+
+def generate_synthetic_db(path: str, rows: int, seed: int = 0) -> list[str]:
+    """
+    실제 db와 같은 스키마의 합성 트리를 만든다. 키워드 색인과 resource_edge는 migrate_schema가 채운다.
+    :return: 생성한 리소스 이름 목록 (질문 생성용)
+    """
+    from langchain_api_resource_db import migrate_schema
+    rng = random.Random(seed)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE langchain_api_resource (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            description TEXT,
+            checksum INTEGER NOT NULL,
+            keywords TEXT,
+            type TEXT,
+            depth INTEGER,
+            parent_id INTEGER,
+            children_ids TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    names = []
+    children = {}
+    previous_level = [0]
+    id = 0
+    for depth, size in enumerate(level_sizes(rows), 1):
+        level = []
+        batch = []
+        for _ in range(size):
+            id += 1
+            name = resource_name(rng)
+            parent_id = rng.choice(previous_level)
+            keywords = [name.lower()] + [part.lower() for part in rng.sample(name_parts, rng.randint(4, 8))]
+            batch.append((id, f"https://example.invalid/api_reference/{depth}/{name}_{id}.html",
+                          f"{name} handles {' '.join(keywords[1:4])} for langchain.", 0, ",".join(keywords),
+                          "class" if depth >= 3 else "category", depth, parent_id))
+            children.setdefault(parent_id, []).append(id)
+            names.append(name)
+            level.append(id)
+        conn.executemany('INSERT INTO langchain_api_resource (id, url, description, checksum, keywords, type, depth, parent_id) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        previous_level = level
+    conn.executemany('UPDATE langchain_api_resource SET children_ids = ? WHERE id = ?',
+                     [(",".join(map(str, ids)), parent_id) for parent_id, ids in children.items() if parent_id])
+    conn.commit()
+    migrate_schema(conn)
+    conn.close()
+    return names
+
+
+def make_questions(names: list[str], count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed + 1)
+    return [f"{rng.choice(names)} {rng.choice(question_suffixes)}".strip() for _ in range(count)]
+
+
+def bench_search(questions: list[str]) -> dict:
+    from langchain_api_resource_snapshot import load_resource_snapshot
+    from gpts_langchain_assistance_api import search_target_urls
+    start = time.perf_counter()
+    snapshot = load_resource_snapshot()
+    load_seconds = time.perf_counter() - start
+    keyword_latencies = []
+    search_latencies = []
+    results = 0
+    for question in questions:
+        start = time.perf_counter()
+        keywords, confidence = snapshot.local_keywords(question)
+        keyword_latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        results += len(search_target_urls(question, keywords or question.split(), snapshot))
+        search_latencies.append(time.perf_counter() - start)
+    return {
+        "snapshot_load_s": load_seconds,
+        "keywords_local": percentiles(keyword_latencies),
+        "search_target_urls": {**percentiles(search_latencies), "qps": len(questions) / sum(search_latencies),
+                               "mean_results": results / len(questions)},
+    }
+
+
+async def bench_api(questions: list[str], concurrency: int, keyword_mode: str) -> dict:
+    import httpx
+    from gpts_langchain_assistance_api import app
+    from langchain_api_resource_snapshot import get_resource_snapshot
+    get_resource_snapshot()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def request(client, question):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/question_answer", params={"question": question, "keyword_mode": keyword_mode})
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(request(client, question) for question in questions))
+        elapsed = time.perf_counter() - start
+    return {**percentiles(latencies), "rps": len(questions) / elapsed, "concurrency": concurrency,
+            "keyword_mode": keyword_mode, "errors": errors}
+
+
+def write_fixture_site(directory: str, categories: int, leaves: int, seed: int = 0) -> int:
+    """
+    API reference와 같은 구조로 링크된 사이트 : index -> category -> class 페이지
+    :return: 페이지 수
+    """
+    rng = random.Random(seed + 2)
+    os.makedirs(directory, exist_ok=True)
+
+    def write(name, body):
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(f"<html><body><header>langchain</header><article class='bd-article'>{body}</article>"
+                    "<footer>footer</footer></body></html>")
+
+    write("index.html", "<h1>API reference</h1>" + "".join(
+        f"<a class='reference internal' href='category_{i}.html'><span class='std std-ref'>Category {i}</span></a>"
+        for i in range(categories)))
+    for i in range(categories):
+        links = "".join(f"<a class='reference internal' href='class_{i}_{j}.html'>{resource_name(rng)}</a>"
+                        for j in range(leaves))
+        write(f"category_{i}.html", f"<h1>Category {i}</h1><p>Classes</p>"
+                                    f"<div class='pst-scrollable-table-container'>{links}</div>")
+        for j in range(leaves):
+            paragraphs = "".join(f"<p>{' '.join(rng.choices(name_parts, k=40))}</p>" for _ in range(5))
+            write(f"class_{i}_{j}.html", f"<h1>{resource_name(rng)}</h1>{paragraphs}")
+    return 1 + categories * (1 + leaves)
+
+
+def bench_crawl_worker(host_interval: float, stages):
+    # 워커 프로세스 하나. stage별 (횟수, 합계 초)를 부모에게 돌려준다
+    import langchain_api_resource_manager as manager
+    from langchain_api_crawler import Crawler
+    from langchain_api_metrics import metrics
+    manager.crawler = Crawler(host_interval=host_interval)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):     # 크롤러 진행 로그는 JSON 보고서와 섞이지 않게
+        manager.run_frontier_worker()
+    stages.put({dict(labels)["stage"]: (histogram[-2], histogram[-1])
+                for (name, labels), histogram in metrics.histograms.items() if name == "stage_seconds"})
+
+
+def bench_crawler(directory: str, categories: int, leaves: int, workers: int, host_interval: float,
+                  llm_latency: float) -> dict:
+    """
+    링크된 fixture 사이트를 frontier 워커 프로세스 workers 개로 크롤링한다 (파싱, stub LLM enrichment, db 쓰기 포함).
+    """
+    import multiprocessing
+    import langchain_api_resource_manager as manager
+    os.environ["LLM_STUB_LATENCY"] = str(llm_latency)     # 워커 프로세스가 import 할 때 읽는다
+    site = os.path.abspath(os.path.join(directory, "site"))
+    pages = write_fixture_site(site, categories, leaves)
+    handler = partial(QuietHandler, directory=site)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cwd = os.getcwd()
+    os.chdir(directory)     # 검색 벤치마크의 합성 db와 분리된 크롤링 db / enrichment 캐시
+    try:
+        for name in ("langchain_api_resource.db", "langchain_api_cache.db"):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(name + suffix):
+                    os.remove(name + suffix)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            manager.generate_langchain_api_resource_db()
+        manager.seed_frontier([f"http://127.0.0.1:{server.server_address[1]}/index.html"])
+        manager.close_crawl_resources()
+
+        context = multiprocessing.get_context("spawn")
+        stages = context.Queue()
+        processes = [context.Process(target=bench_crawl_worker, args=(host_interval, stages)) for _ in range(workers)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        # 워커가 끝나기 전에 queue를 비워야 join이 막히지 않는다. 죽은 워커는 결과를 보내지 않는다
+        results = []
+        while len(results) < workers and (any(process.is_alive() for process in processes) or not stages.empty()):
+            try:
+                results.append(stages.get(timeout=1))
+            except queue.Empty:
+                pass
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        conn = sqlite3.connect("langchain_api_resource.db")
+        states = dict(conn.execute("SELECT state, COUNT(*) FROM crawl_frontier GROUP BY state").fetchall())
+        conn.close()
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+    totals = {}
+    for result in results:
+        for stage, (count, seconds) in result.items():
+            total = totals.setdefault(stage, [0, 0.0])
+            total[0] += count
+            total[1] += seconds
+    return {
+        "pages": pages, "seconds": elapsed, "pages_per_s": states.get("enriched", 0) / elapsed,
+        "frontier": states, "worker_exit_codes": [process.exitcode for process in processes],
+        "workers": workers, "host_interval": host_interval, "llm_latency": llm_latency,
+        # 모든 워커의 합. 워커 안의 스레드가 겹쳐 실행되므로 stage 합계는 경과 시간보다 클 수 있다
+        "stages": {stage: {"count": count, "total_s": seconds, "mean_ms": seconds / count * 1000 if count else 0.0}
+                   for stage, (count, seconds) in sorted(totals.items())},
+    }
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline retrieval / crawling benchmark")
+    parser.add_argument("--rows", type=int, default=10000, help="synthetic langchain_api_resource rows (10k-500k)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--keyword-mode", default="auto", choices=["auto", "local", "llm"])
+    parser.add_argument("--crawl-categories", type=int, default=4, help="fixture site categories")
+    parser.add_argument("--crawl-leaves", type=int, default=50, help="class pages per fixture site category")
+    parser.add_argument("--crawl-workers", type=int, default=1, help="frontier worker processes")
+    parser.add_argument("--crawl-llm-latency", type=float, default=0.5, help="stub LLM latency (s) for page enrichment")
+    parser.add_argument("--host-interval", type=float, default=None, help="crawler per-host interval, default: crawler setting")
+    parser.add_argument("--workdir", default="benchmark_data", help="synthetic db, caches and fixture site go here")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", nargs="*", default=[], choices=["search", "api", "crawler"])
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    args = parser.parse_args()
+
+    # must be set before the api / llm modules are imported
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["KEYWORD_CACHE_DB"] = ""
+    os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+    output = os.path.abspath(args.output) if args.output else None
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)     # modules use the default relative db path
+
+    start = time.perf_counter()
+    names = generate_synthetic_db("langchain_api_resource.db", args.rows, args.seed)
+    report = {
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": {"generate_db_s": time.perf_counter() - start},
+    }
+    questions = make_questions(names, args.queries, args.seed)
+    if "search" not in args.skip:
+        report["results"]["search"] = bench_search(questions)
+    if "api" not in args.skip:
+        report["results"]["api"] = asyncio.run(bench_api(questions, args.concurrency, args.keyword_mode))
+    if "crawler" not in args.skip:
+        from langchain_api_crawler import crawler_host_interval
+        host_interval = crawler_host_interval if args.host_interval is None else args.host_interval
+        report["results"]["crawler"] = bench_crawler("crawl", args.crawl_categories, args.crawl_leaves, args.crawl_workers,
+                                                     host_interval, args.crawl_llm_latency)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
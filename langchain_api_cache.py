@@ -0,0 +1,91 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+question_stopwords = {"a", "an", "the", "for", "of", "to", "in", "on", "at", "by", "with", "about",
+                      "how", "do", "does", "i", "is", "are", "what", "which", "can", "please", "me", "show", "use", "using"}
+
+
+def normalize_question(question: str) -> str:
+    # 대소문자, 구두점, 어순, 불용어 차이만 있는 질문은 같은 키가 되도록 정규화
+    tokens = re.findall(r'\w+', question.lower())
+    return ' '.join(sorted({token for token in tokens if token not in question_stopwords}))
+
+
+class LRUTTLCache:
+    """
+    메모리 LRU + TTL 캐시. db_path를 주면 SQLite 테이블을 2차 저장소로 사용해 재시작 후에도 유지된다.
+    값은 JSON으로 직렬화 가능한 객체여야 한다. ttl이 None이면 만료되지 않는다.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None, db_path: str = None, table: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self._conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                )
+            ''')
+            self._conn.execute(f'DELETE FROM {table} WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time(),))
+            self._conn.commit()
+
+    def _expires_at(self):
+        return None if self.ttl is None else time.time() + self.ttl
+
+    def _remember(self, key, value, expires_at):
+        self._items[key] = (value, expires_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.time():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+            if self._conn is not None:
+                row = self._conn.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+                if row is not None and (row[1] is None or row[1] > time.time()):
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        expires_at = self._expires_at()
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._conn is not None:
+                self._conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                                   (key, json.dumps(value), expires_at))
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent_hits": self.persistent_hits,
+            "size": len(self._items),
+        }
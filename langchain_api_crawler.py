@@ -0,0 +1,131 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from langchain_api_metrics import span
+from langchain_api_page import PageRecord, parse_page
+
+crawler_max_workers = 8         # 동시에 진행할 다운로드 수
+crawler_host_interval = 0.1     # 같은 호스트로 보내는 요청 사이의 최소 간격(초)
+crawler_retries = 3             # 연결 오류, 429/5xx 응답 재시도 횟수
+crawler_timeout = 30            # 요청 1회의 타임아웃(초)
+
+
+class HostRateLimiter:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_at = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_at.get(host, now))
+            self._next_at[host] = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class CrawlResponse:
+    __slots__ = ('url', 'text', 'etag', 'last_modified', 'not_modified')
+
+    def __init__(self, url, text, etag, last_modified, not_modified=False):
+        self.url = url
+        self.text = text                    # not_modified이면 None
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+
+class Crawler:
+    """
+    한 번의 크롤링 실행 동안 사용하는 HTTP 클라이언트.
+    - requests.Session 연결 풀 재사용 (TCP/TLS 핸드셰이크 1회)
+    - ThreadPoolExecutor로 동시 다운로드 수 제한, 호스트별 요청 간격 제한, 재시도
+    - 실행 중 응답/파싱 결과를 캐시해 같은 URL은 한 번만 다운로드하고 한 번만 파싱
+    """
+
+    def __init__(self, max_workers: int = crawler_max_workers, host_interval: float = crawler_host_interval,
+                 retries: int = crawler_retries, timeout: float = crawler_timeout):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crawler")
+        self.rate_limiter = HostRateLimiter(host_interval)
+        self.download_cnt = 0
+        self._responses = {}    # url -> Future[CrawlResponse]
+        self._pages = {}        # url -> [lock, PageRecord]
+        self._lock = threading.Lock()
+
+    def _download(self, url: str, etag: str = None, last_modified: str = None) -> CrawlResponse:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        self.rate_limiter.wait(urlsplit(url).netloc)
+        with span("fetch"):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        with self._lock:
+            self.download_cnt += 1
+        if response.status_code == 304:
+            return CrawlResponse(url, None, etag, last_modified, not_modified=True)
+        response.raise_for_status()
+        return CrawlResponse(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    def fetch_async(self, url: str, etag: str = None, last_modified: str = None) -> Future:
+        # etag/last_modified를 주면 조건부 요청, 변경이 없으면 not_modified 응답(본문 없음)
+        with self._lock:
+            future = self._responses.get(url)
+            if future is None:
+                future = self.executor.submit(self._download, url, etag, last_modified)
+                self._responses[url] = future
+            return future
+
+    def fetch_response(self, url: str, etag: str = None, last_modified: str = None) -> CrawlResponse:
+        return self.fetch_async(url, etag, last_modified).result()
+
+    def fetch(self, url: str) -> str:
+        response = self.fetch_response(url)
+        if response.not_modified:
+            # 조건부 요청으로 받은 304 대신 본문이 필요해진 경우만 다시 받는다
+            with self._lock:
+                self._responses.pop(url, None)
+            response = self.fetch_response(url)
+        return response.text
+
+    def prefetch(self, urls: list[str], validators: dict = None):
+        # 순차 처리 전에 다운로드를 미리 시작해 두면 네트워크 대기가 겹쳐진다
+        # validators : {url: (etag, last_modified)} 조건부 요청에 사용
+        validators = validators or {}
+        for url in urls:
+            self.fetch_async(url, *validators.get(url, (None, None)))
+
+    def page(self, url: str) -> PageRecord:
+        # 페이지마다 한 번만 파싱하고, 파싱 트리 대신 필요한 값만 담은 레코드를 공유한다
+        with self._lock:
+            entry = self._pages.setdefault(url, [threading.Lock(), None])
+        with entry[0]:
+            if entry[1] is None:
+                html = self.fetch(url)
+                with span("parse"):
+                    entry[1] = parse_page(url, html)
+            return entry[1]
+
+    def forget(self, urls: list[str]):
+        # 처리가 끝난 하위 트리의 응답은 메모리에서 내린다
+        with self._lock:
+            for url in urls:
+                self._responses.pop(url, None)
+                self._pages.pop(url, None)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+from langchain_api_metrics import span
+
+db_path = 'langchain_api_resource.db'
+embedding_path = os.path.splitext(db_path)[0] + '.embeddings'     # .f32 (float32 .npy, memory-mapped) / .ids.npy / .hashes.npy / .json / .hnsw
+embedding_backend = os.environ.get("EMBEDDING_BACKEND", "fastembed")    # fastembed | hashing
+embedding_model = os.environ.get("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+embedding_batch_size = 256
+hashing_dim = 512
+ann_min_size = 50000    # 이 행 수 이상이고 hnswlib이 설치되어 있으면 ANN 색인을 사용
+
+
+class HashingEmbedder:
+    """
+    외부 모델 없이 동작하는 CPU 임베더. 단어 unigram과 문자 trigram을 feature hashing 한다.
+    fastembed가 없는 환경이나 오프라인 벤치마크용.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = hashing_dim):
+        self.dim = dim
+
+    def _features(self, text: str):
+        words = re.findall(r'\w+', text.lower())
+        yield from words
+        for word in words:
+            padded = f" {word} "
+            yield from (padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        return normalize_rows(vectors)
+
+
+class FastEmbedEmbedder:
+    def __init__(self, model: str = embedding_model):
+        from fastembed import TextEmbedding
+        self.name = f"fastembed:{model}"
+        self.model = TextEmbedding(model_name=model)
+        self.dim = len(next(iter(self.model.embed(["dim"]))))
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return normalize_rows(np.array(list(self.model.embed(texts, batch_size=embedding_batch_size)), dtype=np.float32))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+embedder = None
+embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global embedder
+    if embedder is None:
+        with embedder_lock:
+            if embedder is None:
+                if embedding_backend == "fastembed":
+                    try:
+                        embedder = FastEmbedEmbedder()
+                    except ImportError:
+                        print("fastembed is not installed, falling back to the hashing embedder")
+                        embedder = HashingEmbedder()
+                else:
+                    embedder = HashingEmbedder()
+    return embedder
+
+
+def resource_text(description, keywords) -> str:
+    return f"{description or ''}\n{(keywords or '').replace(',', ', ')}"
+
+
+def text_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def read_embedding_meta(path: str = embedding_path):
+    try:
+        with open(path + '.json') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_embedding_index(db_path: str = db_path, path: str = embedding_path):
+    """
+    description + keywords를 임베딩해 float32 행렬 파일로 저장한다.
+    같은 임베더로 만든 기존 파일이 있으면 텍스트가 바뀌지 않은 행의 벡터는 다시 계산하지 않는다.
+    새 파일을 모두 쓴 뒤 os.replace로 교체하므로, 읽는 쪽은 이전 파일이나 새 파일 중 하나를 온전히 본다.
+    """
+    model = get_embedder()
+    conn = sqlite3.connect(db_path, timeout=5)
+    rows = conn.execute("SELECT id, description, keywords FROM langchain_api_resource "
+                        "WHERE (description IS NOT NULL AND description != '') OR (keywords IS NOT NULL AND keywords != '') "
+                        "ORDER BY id").fetchall()
+    conn.close()
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    texts = [resource_text(row[1], row[2]) for row in rows]
+    hashes = np.array([text_hash(text) for text in texts], dtype=np.uint64)
+    vectors = np.lib.format.open_memmap(path + '.f32.tmp', mode='w+', dtype=np.float32, shape=(len(rows), model.dim))
+
+    # reuse vectors of unchanged rows
+    todo = list(range(len(rows)))
+    meta = read_embedding_meta(path)
+    if meta and meta["model"] == model.name and meta["dim"] == model.dim and meta["count"]:
+        old_vectors = np.load(path + '.f32', mmap_mode='r')
+        old_rows = {(id, h): i for i, (id, h) in enumerate(zip(np.load(path + '.ids.npy').tolist(),
+                                                                np.load(path + '.hashes.npy').tolist()))}
+        todo = []
+        for i, key in enumerate(zip(ids.tolist(), hashes.tolist())):
+            old = old_rows.get(key)
+            if old is None:
+                todo.append(i)
+            else:
+                vectors[i] = old_vectors[old]
+    for start in range(0, len(todo), embedding_batch_size):
+        batch = todo[start:start + embedding_batch_size]
+        vectors[batch] = model.embed([texts[i] for i in batch])
+    vectors.flush()
+    del vectors
+
+    for suffix, array in [('.ids.npy', ids), ('.hashes.npy', hashes)]:
+        with open(path + suffix + '.tmp', 'wb') as f:
+            np.save(f, array)
+    if len(rows) >= ann_min_size:
+        build_ann_index(path + '.f32.tmp', path + '.hnsw.tmp')
+    os.replace(path + '.f32.tmp', path + '.f32')
+    os.replace(path + '.ids.npy.tmp', path + '.ids.npy')
+    os.replace(path + '.hashes.npy.tmp', path + '.hashes.npy')
+    if os.path.exists(path + '.hnsw.tmp'):
+        os.replace(path + '.hnsw.tmp', path + '.hnsw')
+    elif os.path.exists(path + '.hnsw'):
+        os.remove(path + '.hnsw')
+    with open(path + '.json.tmp', 'w') as f:
+        json.dump({"model": model.name, "dim": model.dim, "count": len(rows)}, f)
+    os.replace(path + '.json.tmp', path + '.json')
+    print(f"embedded {len(todo)} of {len(rows)} resources")
+
+
+def build_ann_index(vectors_path: str, index_path: str):
+    try:
+        import hnswlib
+    except ImportError:
+        return
+    vectors = np.load(vectors_path, mmap_mode='r')
+    index = hnswlib.Index(space='ip', dim=vectors.shape[1])
+    index.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+    index.add_items(vectors, np.arange(len(vectors)))
+    index.save_index(index_path)
+
+
+class EmbeddingIndexError(RuntimeError):
+    # 임베딩 색인이 없거나 질문 임베더와 맞지 않음
+    pass
+
+
+class EmbeddingIndex:
+    """
+    memory-mapped 임베딩 행렬에 대한 top-k cosine 검색. 벡터는 저장 시 정규화되어 있어 내적 = cosine.
+    """
+
+    def __init__(self, path: str = embedding_path):
+        self.meta = read_embedding_meta(path)
+        self.vectors = np.load(path + '.f32', mmap_mode='r')
+        self.ids = np.load(path + '.ids.npy')
+        self.ann = None
+        if os.path.exists(path + '.hnsw'):
+            try:
+                import hnswlib
+                self.ann = hnswlib.Index(space='ip', dim=self.vectors.shape[1])
+                self.ann.load_index(path + '.hnsw', max_elements=len(self.vectors))
+                self.ann.set_ef(64)
+            except ImportError:
+                self.ann = None
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5) -> list[tuple[int, float]]:
+        """
+        :return: [(resource_id, cosine)] 유사도 내림차순
+        """
+        if len(self.ids) == 0:
+            return []
+        top_k = min(top_k, len(self.ids))
+        if self.ann is not None:
+            labels, distances = self.ann.knn_query(query_vector, k=top_k)
+            return [(int(self.ids[i]), float(1 - d)) for i, d in zip(labels[0], distances[0])]
+        scores = self.vectors @ query_vector
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+
+embedding_index = None
+embedding_index_mtime = None
+embedding_index_lock = threading.Lock()
+
+
+def get_embedding_index() -> EmbeddingIndex:
+    # build_embedding_index가 파일을 교체하면 다음 호출에서 다시 연다
+    global embedding_index, embedding_index_mtime
+    try:
+        mtime = os.path.getmtime(embedding_path + '.json')
+    except FileNotFoundError:
+        raise EmbeddingIndexError(f"{embedding_path} embedding index not found, run langchain_api_resource_manager.py to build it")
+    if embedding_index is None or mtime != embedding_index_mtime:
+        with embedding_index_lock:
+            if embedding_index is None or mtime != embedding_index_mtime:
+                embedding_index = EmbeddingIndex()
+                embedding_index_mtime = mtime
+    return embedding_index
+
+
+def semantic_search(question: str, top_k: int = 5) -> list[tuple[int, float]]:
+    model = get_embedder()
+    index = get_embedding_index()
+    # 색인과 질문을 다른 임베더로 만들면 (ex: 크롤러는 hashing, API는 fastembed) 벡터 공간이 달라 비교할 수 없다
+    if index.meta["model"] != model.name or index.meta["dim"] != model.dim:
+        raise EmbeddingIndexError(f"embedding index was built with {index.meta['model']} ({index.meta['dim']}d) "
+                                  f"but queries use {model.name} ({model.dim}d), rebuild the index or set EMBEDDING_BACKEND")
+    with span("embed"):
+        query_vector = model.embed([question])[0]
+    with span("vector_search"):
+        return index.search(query_vector, top_k)
@@ -0,0 +1,90 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+enrichment_workers = 4          # description/keyword 추출 워커 수
+enrichment_queue_size = 32      # 대기 중인 페이지 수 상한 (가득 차면 submit이 블록 = backpressure)
+enrichment_batch_size = 4       # 한 번의 enrich 호출(LLM 요청)에 묶을 최대 페이지 수
+enrichment_batch_chars = 6000   # 묶인 페이지 content 길이 합의 상한. 큰 페이지는 혼자 처리된다
+
+_stop = object()
+
+
+class EnrichmentPipeline:
+    """
+    크롤링된 페이지 -> bounded queue -> 추출 워커 풀 -> 결과 queue -> 단일 writer 스레드
+    워커는 queue에 이미 쌓여 있는 작은 페이지들을 batch_size, batch_chars 안에서 한 번에 가져간다.
+    :param enrich: content 목록을 받아 같은 순서의 [(keywords, description)]을 반환하는 함수. 워커 스레드에서 호출된다.
+    :param write: (id, keywords, description, meta)를 저장하는 함수. writer 스레드 하나에서만 호출된다.
+    """
+
+    def __init__(self, enrich, write, workers: int = enrichment_workers, queue_size: int = enrichment_queue_size,
+                 batch_size: int = enrichment_batch_size, batch_chars: int = enrichment_batch_chars):
+        self.enrich = enrich
+        self.write = write
+        self.batch_size = batch_size
+        self.batch_chars = batch_chars
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.workers = [threading.Thread(target=self._work, name=f"enrichment-{i}", daemon=True)
+                        for i in range(workers)]
+        self.writer = threading.Thread(target=self._write, name="enrichment-writer", daemon=True)
+        for worker in self.workers:
+            worker.start()
+        self.writer.start()
+
+    def submit(self, id, content: str, meta=None) -> Future:
+        # Future는 writer가 결과를 저장한 뒤에 (keywords, description)으로 완료된다
+        # meta는 추출에 쓰지 않고 write에 그대로 전달된다 (ex: checksum, etag)
+        future = Future()
+        self.jobs.put((id, content, meta, future))
+        return future
+
+    def _work(self):
+        carry = None    # 이전 batch에 들어가지 못한 job
+        while True:
+            job = self.jobs.get() if carry is None else carry
+            carry = None
+            if job is _stop:
+                break
+            batch = [job]
+            chars = len(job[1])
+            while len(batch) < self.batch_size:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _stop or chars + len(job[1]) > self.batch_chars:
+                    carry = job
+                    break
+                batch.append(job)
+                chars += len(job[1])
+            try:
+                results = self.enrich([content for _, content, _, _ in batch])
+            except Exception as e:
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (id, content, meta, future), (keywords, description) in zip(batch, results):
+                self.results.put((id, keywords, description, meta, future))
+
+    def _write(self):
+        while True:
+            result = self.results.get()
+            if result is _stop:
+                break
+            id, keywords, description, meta, future = result
+            try:
+                self.write(id, keywords, description, meta)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            future.set_result((keywords, description))
+
+    def close(self):
+        for _ in self.workers:
+            self.jobs.put(_stop)
+        for worker in self.workers:
+            worker.join()
+        self.results.put(_stop)
+        self.writer.join()
@@ -0,0 +1,119 @@
+import os
+import socket
+import time
+
+# crawl_frontier : 크롤링할 url과 상태. 크롤링 중단 후 다시 실행하면 남은 url부터 이어서 처리한다.
+# state   pending  : 아직 처리하지 않음
+#         fetched  : category 페이지를 받아 하위 url을 등록함. 하위 url이 모두 끝나면 통합(description/keywords) 대상
+#         enriched : 완료
+#         failed   : frontier_max_attempts 번 실패
+# lease   : 처리 중인 워커(lease_owner)와 만료 시각. 워커가 죽으면 만료 후 다른 워커가 가져간다
+
+frontier_lease_seconds = 600    # 한 번 가져간 url을 다른 워커가 가져가지 못하는 시간(초)
+frontier_max_attempts = 3       # 이 횟수만큼 가져가서도 끝나지 않은 url은 failed
+frontier_claim_size = 32        # 워커가 한 번에 가져가는 url 수
+
+
+def create_crawl_frontier_table(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_frontier (
+            url TEXT PRIMARY KEY,
+            parent_url TEXT,
+            depth INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            dirty INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            error TEXT,
+            updated_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_crawl_frontier_state ON crawl_frontier (state, depth)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_crawl_frontier_parent ON crawl_frontier (parent_url, state)')
+
+
+def frontier_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reset_frontier(conn, seeds):
+    # 새 크롤링 시작. seeds : [(url, type, depth)]
+    conn.execute('DELETE FROM crawl_frontier')
+    add_frontier_urls(conn, None, seeds)
+
+
+def add_frontier_urls(conn, parent_url, urls):
+    # urls : [(url, type, depth)]. 이미 등록된 url은 그대로 둔다
+    now = time.time()
+    conn.executemany('INSERT OR IGNORE INTO crawl_frontier (url, parent_url, type, depth, updated_at) VALUES (?, ?, ?, ?, ?)',
+                     [(url, parent_url, type, depth, now) for url, type, depth in urls])
+
+
+def claim_frontier_urls(conn, owner: str, limit: int = frontier_claim_size, lease_seconds: float = frontier_lease_seconds,
+                        max_attempts: int = frontier_max_attempts):
+    """
+    처리할 url을 lease와 함께 가져간다. 하위 url이 모두 끝난 fetched category를 먼저, 그 다음 깊은 pending url부터.
+    owner 자신의 lease는 (이전 묶음이 오류로 중단된 경우) 만료 전이라도 다시 가져간다.
+    :return: [(url, parent_url, depth, type, state)]
+    """
+    now = time.time()
+    # 처리 중인 워커가 없는데 시도 횟수를 다 쓴 url (처리 중 워커가 죽었거나, 재개할 때 lease가 풀림)
+    conn.execute('''
+        UPDATE crawl_frontier SET state = 'failed', error = COALESCE(error, 'attempts exhausted'),
+            lease_owner = NULL, lease_expires = NULL
+        WHERE state IN ('pending', 'fetched') AND attempts >= ? AND (lease_expires IS NULL OR lease_expires < ?)
+    ''', (max_attempts, now))
+    return conn.execute('''
+        UPDATE crawl_frontier SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+        WHERE url IN (
+            SELECT url FROM crawl_frontier f
+            WHERE (lease_expires IS NULL OR lease_expires < ? OR lease_owner = ?) AND attempts < ?
+              AND (state = 'pending' OR (state = 'fetched' AND NOT EXISTS (
+                  SELECT 1 FROM crawl_frontier c WHERE c.parent_url = f.url AND c.state IN ('pending', 'fetched'))))
+            ORDER BY state = 'pending', depth DESC
+            LIMIT ?
+        )
+        RETURNING url, parent_url, depth, type, state
+    ''', (owner, now + lease_seconds, now, now, owner, max_attempts, limit)).fetchall()
+
+
+def complete_frontier_url(conn, url, state: str, dirty: bool = False):
+    # 다음 상태로 넘기고 lease를 푼다. 시도 횟수는 상태마다 새로 센다
+    conn.execute('''
+        UPDATE crawl_frontier SET state = ?, dirty = ?, attempts = 0, lease_owner = NULL, lease_expires = NULL,
+            error = NULL, updated_at = ?
+        WHERE url = ?
+    ''', (state, int(dirty), time.time(), url))
+
+
+def fail_frontier_url(conn, url, error: str, max_attempts: int = frontier_max_attempts):
+    # 시도 횟수가 남아 있으면 같은 상태로 되돌려 다시 시도한다
+    conn.execute('''
+        UPDATE crawl_frontier SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE state END,
+            lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ?
+        WHERE url = ?
+    ''', (max_attempts, error, time.time(), url))
+
+
+def release_frontier_leases(conn, owner: str = None, max_attempts: int = frontier_max_attempts):
+    # owner(없으면 모든 워커)가 가진 lease를 푼다. 시도 횟수는 그대로 두고, 다 쓴 url은 failed
+    # (워커를 죽게 만드는 url이 재개할 때마다 다시 시도되지 않도록)
+    conn.execute('''
+        UPDATE crawl_frontier SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE state END,
+            error = CASE WHEN attempts >= ? THEN COALESCE(error, 'attempts exhausted') ELSE error END,
+            lease_owner = NULL, lease_expires = NULL
+        WHERE state IN ('pending', 'fetched') AND lease_owner IS NOT NULL AND (? IS NULL OR lease_owner = ?)
+    ''', (max_attempts, max_attempts, owner, owner))
+
+
+def frontier_dirty(conn, url) -> bool:
+    # url 자신이나 하위 url 중 내용이 바뀐 것이 있는지
+    row = conn.execute('SELECT MAX(dirty) FROM crawl_frontier WHERE url = ? OR parent_url = ?', (url, url)).fetchone()
+    return bool(row[0])
+
+
+def frontier_counts(conn) -> dict:
+    return dict(conn.execute('SELECT state, COUNT(*) FROM crawl_frontier GROUP BY state').fetchall())
@@ -0,0 +1,132 @@
+import math
+import re
+import numpy as np
+from rapidfuzz import fuzz, process
+from langchain_api_metrics import count
+
+# Inverted index over langchain_api_resource.keywords.
+# resource_keyword : resource_id -> normalized keyword posting list
+# keyword_trigram  : trigram -> normalized keyword, used to find fuzzy candidates
+#                    without scanning every row at a depth (queried in memory by ResourceSnapshot.candidates).
+
+trigram_min_shared = 0.3    # a candidate keyword must share 30% of the query keyword trigrams
+candidate_limit = 200       # max candidate keywords returned per query keyword
+score_cutoff = 40           # term similarity (0~100) below this counts as no match
+
+
+def normalize_keyword(keyword: str) -> str:
+    keyword = keyword.strip().replace("'", "").replace('"', '')
+    # LLM 출력의 번호/글머리 기호 제거 (ex: "1. keyword", "- keyword")
+    keyword = re.sub(r'^(\d+[\.\)]|[-*•])\s*', '', keyword)
+    return re.sub(r'\s+', ' ', keyword).lower()
+
+
+def get_trigrams(keyword: str) -> set[str]:
+    padded = f"  {keyword} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def min_shared_trigrams(trigrams: set[str]) -> int:
+    return max(1, math.ceil(len(trigrams) * trigram_min_shared))
+
+
+def create_keyword_index_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resource_keyword (
+            resource_id INTEGER NOT NULL,
+            keyword TEXT NOT NULL,
+            PRIMARY KEY (resource_id, keyword)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_resource_keyword_keyword ON resource_keyword (keyword)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS keyword_trigram (
+            trigram TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            PRIMARY KEY (trigram, keyword)
+        ) WITHOUT ROWID
+    ''')
+
+
+def index_resource_keywords(conn, resource_id, keywords):
+    """
+    한 리소스의 키워드 색인을 증분 갱신한다. commit은 호출자가 한다.
+    :param conn: sqlite3 connection
+    :param resource_id: langchain_api_resource.id
+    :param keywords: 새 키워드 목록 (정규화 전)
+    """
+    cursor = conn.cursor()
+    new_keywords = {normalize_keyword(keyword) for keyword in keywords} - {''}
+    cursor.execute('SELECT keyword FROM resource_keyword WHERE resource_id = ?', (resource_id,))
+    old_keywords = {row[0] for row in cursor.fetchall()}
+    removed = old_keywords - new_keywords
+    added = new_keywords - old_keywords
+
+    cursor.executemany('DELETE FROM resource_keyword WHERE resource_id = ? AND keyword = ?',
+                       [(resource_id, keyword) for keyword in removed])
+    cursor.executemany('INSERT OR IGNORE INTO resource_keyword (resource_id, keyword) VALUES (?, ?)',
+                       [(resource_id, keyword) for keyword in added])
+    cursor.executemany('INSERT OR IGNORE INTO keyword_trigram (trigram, keyword) VALUES (?, ?)',
+                       [(trigram, keyword) for keyword in added for trigram in get_trigrams(keyword)])
+    # drop trigrams of keywords no longer used by any resource
+    for keyword in removed:
+        cursor.execute('SELECT 1 FROM resource_keyword WHERE keyword = ? LIMIT 1', (keyword,))
+        if cursor.fetchone() is None:
+            cursor.executemany('DELETE FROM keyword_trigram WHERE trigram = ? AND keyword = ?',
+                               [(trigram, keyword) for trigram in get_trigrams(keyword)])
+
+
+def rebuild_keyword_index(conn):
+    create_keyword_index_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM resource_keyword')
+    cursor.execute('DELETE FROM keyword_trigram')
+    cursor.execute("SELECT id, keywords FROM langchain_api_resource WHERE keywords IS NOT NULL AND keywords != ''")
+    for resource_id, keywords in cursor.fetchall():
+        index_resource_keywords(conn, resource_id, keywords.split(','))
+
+
+def ensure_keyword_index(conn):
+    # build the index once for db files created before the index existed
+    create_keyword_index_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute('SELECT 1 FROM resource_keyword LIMIT 1')
+    if cursor.fetchone() is None:
+        rebuild_keyword_index(conn)
+
+
+def rank_resources(keywords: list[str], resource_terms: dict[int, list[str]], top_k: int = 5) -> list[tuple[int, float]]:
+    """
+    질문 키워드 전체와 후보 리소스 키워드 전체의 유사도를 한 번의 cdist 행렬 계산으로 구한다.
+    리소스 점수 = 질문 키워드별 (리소스 키워드 중 최고 유사도)의 평균
+    :param keywords: 질문 키워드 목록
+    :param resource_terms: {resource_id: 정규화된 키워드 목록}
+    :param top_k: 반환할 최대 리소스 수
+    :return: [(resource_id, score)] 점수 내림차순
+    """
+    queries = [keyword for keyword in dict.fromkeys(normalize_keyword(keyword) for keyword in keywords) if keyword]
+    resource_ids = [resource_id for resource_id, terms in resource_terms.items() if terms]
+    if not queries or not resource_ids:
+        return []
+
+    # unique terms are scored once, then gathered into per-resource column runs
+    term_positions = {}
+    flat_terms = []
+    offsets = []
+    for resource_id in resource_ids:
+        offsets.append(len(flat_terms))
+        for term in resource_terms[resource_id]:
+            flat_terms.append(term_positions.setdefault(term, len(term_positions)))
+    unique_terms = list(term_positions)
+
+    count("similarity_comparisons_total", len(queries) * len(unique_terms))
+    scores = process.cdist(queries, unique_terms, scorer=fuzz.ratio, score_cutoff=score_cutoff,
+                           dtype=np.uint8, workers=-1)
+    per_resource = np.maximum.reduceat(scores[:, flat_terms], offsets, axis=1)
+    resource_scores = per_resource.mean(axis=0)
+
+    top_k = min(top_k, len(resource_ids))
+    top = np.argpartition(-resource_scores, top_k - 1)[:top_k]
+    top = top[np.argsort(-resource_scores[top], kind='stable')]
+    return [(resource_ids[i], float(resource_scores[i])) for i in top if resource_scores[i] > 0]
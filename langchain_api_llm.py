@@ -0,0 +1,140 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from langchain_api_metrics import count, span
+
+llm_backend = os.environ.get("LLM_BACKEND", "ollama")               # ollama | stub (오프라인 벤치마크/테스트용)
+llm_stub_latency = float(os.environ.get("LLM_STUB_LATENCY", "0"))   # stub 응답 지연(초)
+llm_model = os.environ.get("LLM_MODEL", "mistral")
+llm_pool_size = int(os.environ.get("LLM_POOL_SIZE", "4"))           # 동시에 진행할 수 있는 LLM 호출 수
+llm_timeout = float(os.environ.get("LLM_TIMEOUT", "60"))            # LLM 호출 1회의 최대 대기 시간(초)
+
+generation_kwargs = {
+    "max_tokens": 4096,                 #max_tokens: 생성할 최대 토큰 수를 4096으로 설정합니다.
+    "top_p": 0.95,                      #top_p: 누적 확률 분포에서 상위 95%의 토큰만 고려합니다.
+    "top_k": 50,                        #top_k: 각 단계에서 가장 가능성 있는 50개의 토큰만 고려합니다.
+    "repeat_penalty": 1.1,              #repeat_penalty: 반복을 피하기 위해 이미 생성된 토큰에 1.1의 페널티를 적용합니다.
+    "stop": ["[INST]", "[/INST]"],      #stop: "[INST]"와 "[/INST]"를 만나면 생성을 중지합니다.
+}
+
+
+class StubLLM:
+    """
+    Ollama 없이 파이프라인을 돌려 보기 위한 결정적(deterministic) LLM 대역.
+    키워드 프롬프트에는 본문 단어를 콤마로, 그 외 프롬프트에는 앞부분 35단어를 돌려준다.
+    페이지별 description + keywords를 묻는 JSON 프롬프트("### page n" 구역)에는 JSON 배열을 돌려준다.
+    """
+
+    def __init__(self, latency: float = llm_stub_latency):
+        self.latency = latency
+
+    def _respond(self, prompt: str) -> SimpleNamespace:
+        if "### page" in prompt:
+            pages = []
+            for i, section in enumerate(prompt.split("### page")[1:], 1):
+                words = re.findall(r'[A-Za-z_][A-Za-z0-9_\.]{2,}', section.replace("[/INST]", ""))
+                pages.append({"page": i, "description": " ".join(words[:35]), "keywords": list(dict.fromkeys(words[:20]))})
+            return SimpleNamespace(content=json.dumps(pages))
+        body = prompt.rsplit(":", 1)[-1]
+        words = re.findall(r'[A-Za-z_][A-Za-z0-9_\.]{2,}', body.replace("[/INST]", ""))
+        if "keywords" in prompt:
+            content = ", ".join(dict.fromkeys(words[:20]))
+        else:
+            content = " ".join(words[:35])
+        return SimpleNamespace(content=content)
+
+    def invoke(self, prompt: str) -> SimpleNamespace:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt: str) -> SimpleNamespace:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+
+def create_llm():
+    if llm_backend == "stub":
+        return StubLLM()
+    from langchain.chat_models import ChatOllama
+    return ChatOllama(
+        model=llm_model,
+        temperature=0.1,
+        device="device",
+        timeout=int(llm_timeout),
+        generation_kwargs=generation_kwargs,
+    )
+
+
+class LLMClientPool:
+    """
+    ChatOllama 클라이언트를 미리 만들어 재사용하고, 동시 호출 수와 타임아웃을 제한한다.
+    동기 호출(invoke)과 비동기 호출(ainvoke) 모두 같은 클라이언트와 같은 동시 호출 한도(size)를 나눠 쓴다.
+    """
+
+    def __init__(self, size: int = llm_pool_size, timeout: float = llm_timeout):
+        self.timeout = timeout
+        self.clients = [create_llm() for _ in range(size)]
+        self._next_client = itertools.count()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    def _client(self):
+        return self.clients[next(self._next_client) % len(self.clients)]
+
+    def invoke(self, prompt: str) -> str:
+        with self._semaphore, span("llm"):
+            response = self._client().invoke(prompt)
+        return record_llm_response(prompt, response)
+
+    async def _acquire(self):
+        # 이벤트 루프를 막지 않도록 동기 semaphore를 non-blocking으로 다시 시도한다.
+        # 기다리는 중에 취소(타임아웃)되어도 slot을 잡은 채 남지 않는다
+        delay = 0.001
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    async def _ainvoke(self, prompt: str):
+        await self._acquire()
+        try:
+            with span("llm"):
+                return await self._client().ainvoke(prompt)
+        finally:
+            self._semaphore.release()
+
+    async def ainvoke(self, prompt: str) -> str:
+        # 타임아웃은 slot을 기다린 시간까지 포함한다 (포화 상태에서도 timeout 안에 504로 끝난다)
+        try:
+            response = await asyncio.wait_for(self._ainvoke(prompt), self.timeout)
+        except asyncio.TimeoutError:
+            count("llm_timeouts_total")
+            raise
+        return record_llm_response(prompt, response)
+
+
+def record_llm_response(prompt: str, response) -> str:
+    # ollama는 response_metadata에 토큰 수를 준다. 없으면 단어 수로 근사
+    metadata = getattr(response, "response_metadata", None) or {}
+    count("llm_calls_total")
+    count("llm_tokens_total", metadata.get("prompt_eval_count") or len(prompt.split()), kind="prompt")
+    count("llm_tokens_total", metadata.get("eval_count") or len(response.content.split()), kind="completion")
+    return response.content
+
+
+llm_pool = None
+llm_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    global llm_pool
+    if llm_pool is None:
+        with llm_pool_lock:
+            if llm_pool is None:
+                llm_pool = LLMClientPool()
+    return llm_pool
@@ -0,0 +1,115 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+metrics_prefix = "langchain_api_"
+latency_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 요청 하나의 {stage: 누적 초}. asyncio.to_thread는 context를 복사하므로 워커 스레드의 span도 같은 dict에 기록된다
+request_stages = ContextVar("request_stages", default=None)
+# 현재 열린 span의 [하위 span 누적 초]. 요청 breakdown에는 하위 span을 뺀 시간만 기록해 합이 전체 시간을 넘지 않는다
+active_span = ContextVar("active_span", default=None)
+
+
+class MetricsRegistry:
+    """
+    Prometheus text format으로 내보내는 최소한의 counter / gauge / histogram 저장소.
+    metric 키는 (name, labels) 이고 labels는 정렬된 (key, value) tuple.
+    """
+
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = buckets
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}    # key -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, metrics in [("counter", self.counters), ("gauge", self.gauges)]:
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {metrics_prefix}{name} {kind}")
+                    for (metric, labels), value in sorted(metrics.items()):
+                        if metric == name:
+                            lines.append(f"{metrics_prefix}{name}{format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {metrics_prefix}{name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(self.buckets, histogram):
+                        lines.append(f"{metrics_prefix}{name}_bucket{format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{metrics_prefix}{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram[-2]}")
+                    lines.append(f"{metrics_prefix}{name}_count{format_labels(labels)} {histogram[-2]}")
+                    lines.append(f"{metrics_prefix}{name}_sum{format_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def count(name: str, value: float = 1, **labels):
+    metrics.inc(name, value, **labels)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    stage 실행 시간을 stage_seconds histogram(하위 span 포함)과 현재 요청의 stage breakdown(하위 span 제외)에 기록한다.
+    ex: keywords_local 안에서 snapshot_load가 실행되면 breakdown의 keywords_local에는 snapshot_load 시간이 빠진다.
+    """
+    parent = active_span.get()
+    children = [0.0]
+    token = active_span.set(children)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        active_span.reset(token)
+        if parent is not None:
+            parent[0] += elapsed
+        metrics.observe("stage_seconds", elapsed, stage=stage)
+        stages = request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + max(0.0, elapsed - children[0])
+
+
+def start_request_stages() -> dict:
+    stages = {}
+    request_stages.set(stages)
+    return stages
+
+
+def format_server_timing(stages: dict) -> str:
+    # Server-Timing header 형식 : keywords;dur=12.3, search;dur=4.1 (ms)
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items())
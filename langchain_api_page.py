@@ -0,0 +1,70 @@
+import lxml.etree
+import lxml.html
+
+# class 속성에 이 단어들이 모두 있는 요소 (bs4의 class_='a b'와 같은 대상)
+def has_classes(*names) -> str:
+    return " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+article_xpath = f"//article[{has_classes('bd-article')}]"
+nav_links_xpath = f"(//div[{has_classes('bd-toc-item', 'navbar-nav')}])[1]//a[{has_classes('reference', 'internal')}]/@href"
+category_links_xpath = f".//a[{has_classes('reference', 'internal')}][.//span[{has_classes('std', 'std-ref')}]]/@href"
+table_links_xpath = (f"following::div[{has_classes('pst-scrollable-table-container')}][1]"
+                     f"//a[{has_classes('reference', 'internal')}]/@href")
+
+
+class PageRecord:
+    """
+    한 번 파싱한 API reference 페이지에서 이후 단계가 쓰는 값만 남긴 레코드. (파싱 트리는 보관하지 않음)
+    href는 페이지 기준 상대 경로 그대로.
+    """
+    __slots__ = ('url', 'article_text', 'nav_hrefs', 'category_hrefs', 'class_hrefs', 'function_hrefs')
+
+    def __init__(self, url, article_text, nav_hrefs, category_hrefs, class_hrefs, function_hrefs):
+        self.url = url
+        self.article_text = article_text        # bd-article 본문 텍스트 (없으면 페이지 전체), checksum과 LLM 입력
+        self.nav_hrefs = nav_hrefs              # 왼쪽 navbar의 category 링크
+        self.category_hrefs = category_hrefs    # 본문의 하위 category 링크
+        self.class_hrefs = class_hrefs          # 'Classes' 표의 링크
+        self.function_hrefs = function_hrefs    # 'Functions' 표의 링크
+
+
+def section_table_hrefs(document, title: str) -> list[str]:
+    # <p>title</p> 다음에 나오는 첫 번째 표의 링크
+    for p in document.iter('p'):
+        if p.text_content() == title:
+            return [href for href in p.xpath(table_links_xpath) if href]
+    return []
+
+
+def article_text(element) -> str:
+    # bs4 get_text(separator='\n', strip=True)와 같은 결과 (script/style/comment 제외)
+    parts = []
+    collect_text(element, parts)
+    return '\n'.join(text for text in (part.strip() for part in parts) if text)
+
+
+def collect_text(element, parts: list[str]):
+    if isinstance(element.tag, str) and element.tag not in ('script', 'style'):
+        if element.text:
+            parts.append(element.text)
+        for child in element:
+            collect_text(child, parts)
+            if child.tail:
+                parts.append(child.tail)
+
+
+def parse_page(url: str, html: str) -> PageRecord:
+    try:
+        document = lxml.html.document_fromstring(html)
+    except lxml.etree.ParserError:     # 빈 문서
+        return PageRecord(url, '', [], [], [], [])
+    articles = document.xpath(article_xpath)
+    article = articles[0] if articles else None
+    return PageRecord(
+        url=url,
+        article_text=article_text(article if article is not None else document),
+        nav_hrefs=[href for href in document.xpath(nav_links_xpath) if href],
+        category_hrefs=[] if article is None else article.xpath(category_links_xpath),
+        class_hrefs=section_table_hrefs(document, 'Classes'),
+        function_hrefs=section_table_hrefs(document, 'Functions'),
+    )
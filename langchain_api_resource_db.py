@@ -0,0 +1,204 @@
+import itertools
+import sqlite3
+import threading
+import time
+from langchain_api_frontier import create_crawl_frontier_table
+from langchain_api_keyword_index import ensure_keyword_index
+from langchain_api_metrics import span
+
+db_path = 'langchain_api_resource.db'
+batch_size = 200        # 이 행 수만큼 쓰기가 쌓이면 commit
+batch_interval = 2.0    # 마지막 commit 이후 이 시간(초)이 지나면 commit
+
+
+class ResourceDB:
+    """
+    langchain_api_resource.db에 대한 단일 연결(WAL 모드) 접근 계층.
+    쓰기는 버퍼에 모았다가 같은 문장끼리 executemany로 실행하고, batch_size 행 또는 batch_interval 초마다 commit 한다.
+    트랜잭션은 commit 할 때만 짧게 열고 호출 밖으로 열어 두지 않으므로, 네트워크나 LLM을 기다리는 동안
+    다른 워커 프로세스의 쓰기를 막지 않는다.
+    읽기는 버퍼를 먼저 commit 하므로 자신의 쓰기를 본다.
+    여러 스레드에서 공유할 수 있다.
+    """
+
+    def __init__(self, path: str = db_path, batch_size: int = batch_size, batch_interval: float = batch_interval):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._lock = threading.RLock()
+        self._pending = []          # [(query, params)] commit 대기 중인 쓰기
+        self._committed_at = time.monotonic()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="resource-db-flusher", daemon=True)
+        self._flusher.start()
+
+    def _transaction(self, func=None, *args):
+        """
+        버퍼의 쓰기와 func(conn, *args)를 트랜잭션 하나로 실행하고 바로 commit 한다.
+        IMMEDIATE로 시작해야 다른 프로세스가 쓰는 중이면 busy timeout 동안 기다린다
+        (DEFERRED 트랜잭션은 읽은 뒤 쓰기로 올라갈 때 다른 프로세스가 commit 했으면 기다리지 않고 'database is locked')
+        """
+        with span("db_commit"):    # 다른 프로세스의 쓰기 lock을 기다린 시간 포함
+            self.conn.execute('BEGIN IMMEDIATE')
+            pending, self._pending = self._pending, []
+            try:
+                # 연속된 같은 문장은 executemany 한 번으로 실행
+                for query, group in itertools.groupby(pending, key=lambda write: write[0]):
+                    self.conn.executemany(query, [params for _, params in group])
+                result = func(self.conn, *args) if func is not None else None
+                self.conn.execute('COMMIT')
+            except BaseException:
+                if self.conn.in_transaction:
+                    self.conn.execute('ROLLBACK')
+                raise
+        self._committed_at = time.monotonic()
+        return result
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.batch_interval):
+            with self._lock:
+                if self._pending and time.monotonic() - self._committed_at >= self.batch_interval:
+                    try:
+                        self._transaction()
+                    except sqlite3.OperationalError as e:
+                        print(f"resource db flush failed : {e!r}")
+
+    def write(self, query: str, params):
+        with self._lock:
+            self._pending.append((query, tuple(params)))
+            if len(self._pending) >= self.batch_size:
+                self._transaction()
+
+    def execute(self, query: str, params=()):
+        # 결과가 바로 필요한 쓰기/읽기. 버퍼를 먼저 commit 해 쓰기 순서를 유지한다
+        with self._lock:
+            if not query.lstrip().upper().startswith('SELECT'):
+                return self._transaction(lambda conn: conn.execute(query, params).fetchall())
+            if self._pending:
+                self._transaction()
+            return self.conn.execute(query, params).fetchall()
+
+    def read(self, func, *args):
+        # 읽기만 하는 func(conn, *args). 트랜잭션을 열지 않으므로 실행할 때마다 최신 commit을 본다
+        with self._lock:
+            if self._pending:
+                self._transaction()
+            return func(self.conn, *args)
+
+    def run(self, func, *args):
+        # 쓰기가 있는 func(conn, *args)를 버퍼의 쓰기와 같은 트랜잭션 안에서 실행하고 commit 한다 (ex: 키워드 색인 갱신)
+        with self._lock:
+            return self._transaction(func, *args)
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._transaction()
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self.conn.close()
+
+
+def add_validator_columns(conn):
+    # etag, last_modified : 조건부 요청(incremental recrawl)에 사용
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA table_info(langchain_api_resource)')
+    columns = {row[1] for row in cursor.fetchall()}
+    for column, column_type in [('etag', 'TEXT'), ('last_modified', 'TEXT')]:
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE langchain_api_resource ADD COLUMN {column} {column_type}')
+
+
+def ensure_unique_url(conn):
+    # url 중복 행은 가장 먼저 추가된 행만 남기고, add_item의 ON CONFLICT(url) 대상 인덱스를 만든다
+    cursor = conn.cursor()
+    cursor.execute('''
+        DELETE FROM langchain_api_resource
+        WHERE id NOT IN (SELECT MIN(id) FROM langchain_api_resource GROUP BY url)
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_langchain_api_resource_url ON langchain_api_resource (url)')
+
+
+def create_resource_edge_table(conn):
+    # parent -> children 관계. children_ids(콤마 문자열)와 parent_id 컬럼에서 채운다
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resource_edge (
+            parent_id INTEGER NOT NULL,
+            child_id INTEGER NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (parent_id, child_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_resource_edge_child ON resource_edge (child_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_langchain_api_resource_depth ON langchain_api_resource (depth)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_langchain_api_resource_parent ON langchain_api_resource (parent_id)')
+    cursor.execute("SELECT id, children_ids FROM langchain_api_resource WHERE children_ids IS NOT NULL AND children_ids != ''")
+    for parent_id, children_ids in cursor.fetchall():
+        set_resource_children(conn, parent_id, [int(id) for id in children_ids.split(',') if id])
+    cursor.execute('''
+        INSERT OR IGNORE INTO resource_edge (parent_id, child_id, position)
+        SELECT parent_id, id, id FROM langchain_api_resource WHERE parent_id IS NOT NULL AND parent_id != 0
+    ''')
+
+
+def set_resource_children(conn, parent_id, children_ids):
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM resource_edge WHERE parent_id = ?', (parent_id,))
+    cursor.executemany('INSERT OR IGNORE INTO resource_edge (parent_id, child_id, position) VALUES (?, ?, ?)',
+                       [(parent_id, child_id, position) for position, child_id in enumerate(children_ids)])
+
+
+def create_resource_revision_table(conn):
+    # 검색 결과에 영향을 주는 변경(update_item)마다 1씩 올리는 카운터. 검색 스냅샷의 reload 워터마크
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resource_revision (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            revision INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO resource_revision (id, revision) VALUES (0, 0)')
+
+
+bump_resource_revision_query = 'UPDATE resource_revision SET revision = revision + 1'
+
+
+# PRAGMA user_version = 적용된 migration 수. 새 migration은 끝에만 추가한다
+schema_migrations = [
+    add_validator_columns,
+    ensure_unique_url,
+    ensure_keyword_index,
+    create_resource_edge_table,
+    create_crawl_frontier_table,
+    create_resource_revision_table,
+]
+
+
+def migrate_schema(conn):
+    """
+    langchain_api_resource 테이블이 있는 db 파일에 아직 적용되지 않은 migration을 순서대로 적용한다 (in place).
+    migration 하나와 user_version 갱신을 트랜잭션 하나로 commit 하므로, 중간에 중단되면 그 migration은 처음부터 다시 적용된다.
+    migration 함수는 commit 하지 않는다.
+    """
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    for i, migration in enumerate(schema_migrations[version:], version + 1):
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            migration(conn)
+            cursor.execute(f'PRAGMA user_version = {i}')
+            cursor.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
@@ -1,21 +1,65 @@
+import argparse
 import hashlib
-import sqlite3
-import requests
-from bs4 import BeautifulSoup
-from langchain.chat_models import ChatOllama
-from readability import Document
+import json
 import multiprocessing
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain_api_cache import LRUTTLCache
+from langchain_api_crawler import Crawler
+from langchain_api_embeddings import build_embedding_index
+from langchain_api_enrichment import EnrichmentPipeline
+from langchain_api_frontier import (add_frontier_urls, claim_frontier_urls, complete_frontier_url, fail_frontier_url,
+                                    frontier_counts, frontier_dirty, frontier_worker_id, release_frontier_leases,
+                                    reset_frontier)
+from langchain_api_keyword_index import index_resource_keywords
+from langchain_api_llm import get_llm_pool, llm_pool_size
+from langchain_api_resource_db import ResourceDB, bump_resource_revision_query, db_path, migrate_schema, set_resource_children
 
 langchain_api_refer_url = "https://python.langchain.com/api_reference/index.html"
 langchain_api_refer_url_base = "https://python.langchain.com/api_reference/"
 unuseful_keywords = ["This module", "This class", "This function", "class", "function", "method", "property", "Base", "Abstract", "Interface", "required", 'str', 'dict', 'list', 'any', 'optional']
 
 update_cnt = 0
-conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-cursor = conn.cursor()
-cursor.execute('SELECT MAX(LENGTH(description)) FROM langchain_api_resource')
-maxlen = cursor.fetchone()[0]
-conn.close()
+incremental_refresh = False     # True면 변경된 페이지(ETag/Last-Modified, checksum)만 다시 추출
+crawler = None
+resource_db = None
+enrichment_pipeline = None
+enrichment_prompt_version = "1"         # 페이지 enrichment 프롬프트나 후처리를 바꾸면 올린다 (이전 캐시 결과 무효화)
+enrichment_content_limit = 4000         # 프롬프트에 넣는 페이지 본문 최대 길이
+enrichment_cache_db = 'langchain_api_cache.db'
+enrichment_cache = None
+enrichment_cache_lock = threading.Lock()
+frontier_idle_interval = 1.0            # 다른 워커의 url만 남았을 때 다시 확인하는 간격(초)
+prompt_executor = ThreadPoolExecutor(max_workers=llm_pool_size, thread_name_prefix="prompt")
+
+def get_crawler() -> Crawler:
+    global crawler
+    if crawler is None:
+        crawler = Crawler()
+    return crawler
+
+def get_resource_db() -> ResourceDB:
+    global resource_db
+    if resource_db is None:
+        resource_db = ResourceDB()
+    return resource_db
+
+def get_enrichment_pipeline() -> EnrichmentPipeline:
+    global enrichment_pipeline
+    if enrichment_pipeline is None:
+        enrichment_pipeline = EnrichmentPipeline(enrich_contents, write_enrichment)
+    return enrichment_pipeline
+
+def get_enrichment_cache() -> LRUTTLCache:
+    # 본문 hash -> [keywords, description]. 중단/반복된 크롤링에서 같은 본문은 다시 생성하지 않는다
+    global enrichment_cache
+    if enrichment_cache is None:
+        with enrichment_cache_lock:
+            if enrichment_cache is None:
+                enrichment_cache = LRUTTLCache(4096, None, enrichment_cache_db, table="enrichment_cache")
+    return enrichment_cache
 
 def create_table(conn):
     cursor = conn.cursor()
@@ -34,43 +78,51 @@ def create_table(conn):
         )
     ''')
     conn.commit()
+    migrate_schema(conn)
 
 def get_item_from_url(url, items:[str]):
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
     query = 'SELECT ' + ', '.join(items) + ' FROM langchain_api_resource WHERE url = ?'
-    cursor.execute(query, (url,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result
+    result = get_resource_db().execute(query, (url,))
+    return result[0] if result else None
+
+def get_items_from_urls(urls, items:[str]) -> dict:
+    # one indexed lookup for a whole page of children, {url: row}
+    if not urls:
+        return {}
+    query = 'SELECT url, ' + ', '.join(items) + ' FROM langchain_api_resource WHERE url IN (' + ', '.join('?' * len(urls)) + ')'
+    return {row[0]: row[1:] for row in get_resource_db().execute(query, urls)}
+
+def get_children_keywords(children_ids) -> list[list[str]]:
+    # resource_keyword (resource_id, keyword) primary key lookup
+    if not children_ids:
+        return []
+    rows = get_resource_db().execute(
+        'SELECT resource_id, keyword FROM resource_keyword WHERE resource_id IN (' + ', '.join('?' * len(children_ids)) + ')',
+        children_ids)
+    keywords = {id: [] for id in children_ids}
+    for id, keyword in rows:
+        keywords[id].append(keyword)
+    return [keywords[id] for id in children_ids]
 
 def add_item(url, checksum, type, depth, parent_id):
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
-    
-    # exception logic 
-    cursor.execute('SELECT id FROM langchain_api_resource WHERE url = ?', (url,))
-    existing_item = cursor.fetchone()
-    if existing_item:
-        return existing_item[0]
-    
-    # insert logic
-    cursor.execute('''
+    # existing url : no-op update so RETURNING still yields the existing id
+    id = get_resource_db().execute('''
         INSERT INTO langchain_api_resource (url, checksum, type, depth, parent_id)
         VALUES (?, ?, ?, ?, ?)
-    ''', (url, checksum, type, depth, parent_id))
-    conn.commit()
-    return cursor.lastrowid
+        ON CONFLICT (url) DO UPDATE SET url = excluded.url
+        RETURNING id
+    ''', (url, checksum, type, depth, parent_id))[0][0]
+    if parent_id:
+        get_resource_db().write('INSERT OR IGNORE INTO resource_edge (parent_id, child_id, position) VALUES (?, ?, ?)',
+                                (parent_id, id, id))
+    return id
 
-def update_item(update_flag, id, description=None, keywords=None, children_ids=None):
+def update_item(update_flag, id, description=None, keywords=None, children_ids=None, checksum=None, etag=None, last_modified=None):
     global update_cnt
     update_cnt += 1
     print_update_cnt(id)
     if update_flag == False:
         return
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
     update_query = "UPDATE langchain_api_resource SET updated_at = CURRENT_TIMESTAMP"
     update_params = []
 
@@ -88,118 +140,52 @@ def update_item(update_flag, id, description=None, keywords=None, children_ids=N
         update_query += ", children_ids = ?"
         update_params.append(children_ids_str)
     
+    if checksum is not None:
+        update_query += ", checksum = ?, etag = ?, last_modified = ?"
+        update_params.extend([checksum, etag, last_modified])
+    
     update_query += " WHERE id = ?"
     update_params.append(id)
 
-    cursor.execute(update_query, update_params)
-    conn.commit()
+    get_resource_db().write(update_query, update_params)
+    get_resource_db().write(bump_resource_revision_query, ())
+    if keywords is not None:
+        get_resource_db().run(index_resource_keywords, id, keywords)
+    if children_ids is not None:
+        get_resource_db().run(set_resource_children, id, children_ids)
+
+def update_validators(id, checksum, etag, last_modified):
+    # description/keywords는 그대로이고 checksum, 캐시 검증값만 바뀐 경우. 검색 스냅샷 워터마크(resource_revision)는 올리지 않는다
+    get_resource_db().write('UPDATE langchain_api_resource SET checksum = ?, etag = ?, last_modified = ? WHERE id = ?',
+                            (checksum, etag, last_modified, id))
+
+def content_checksum(content):
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
 
 def get_checksum(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    # Remove header and footer
-    for tag in soup(['header', 'footer']):
-        tag.decompose()
-    
-    # Extract main content
-    content = soup.get_text()
-    
-    # Calculate checksum
-    checksum = hashlib.md5(content.encode('utf-8')).hexdigest()
-    
-    return checksum
+    # checksum of the article body only, so nav/header/footer changes don't mark a page dirty
+    return content_checksum(get_page_content(url))
 
 
 def generate_langchain_api_resource_db():
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    create_table(conn)
+    # migration은 스스로 commit 하므로 ResourceDB의 트랜잭션 밖에서 별도 연결로 실행한다
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        create_table(conn)
+    finally:
+        conn.close()
     print("langchain_api_resource 테이블이 성공적으로 생성되었습니다.")
 
+# 링크와 본문은 crawler가 페이지당 한 번 파싱한 PageRecord에서 읽는다 (langchain_api_page)
 def get_category_hrefs(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    nav_element = soup.find('div', class_='bd-toc-item navbar-nav')
-    if nav_element:
-        links = nav_element.find_all('a', class_='reference internal')
-        hrefs = [link.get('href') for link in links if link.get('href')]
-        return hrefs
-    return []
-
-def parse_page_get_internal_category_hrefs(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    article_section = soup.find('article', class_='bd-article')
-    if article_section:
-        links = article_section.find_all('a', class_='reference internal')
-        hrefs = []
-        for link in links:
-            if link.find('span', class_='std std-ref'):
-                hrefs.append(link.get('href'))
-        return hrefs
-    return []
-
-def page_parse_get_classes(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    classes_section = soup.find('p', string='Classes')
-    if classes_section:
-        table_container = classes_section.find_next('div', class_='pst-scrollable-table-container')
-        if table_container:
-            links = table_container.find_all('a', class_='reference internal')
-            hrefs = [link.get('href') for link in links if link.get('href')]
-            return hrefs
-    return []
-
-def page_parse_get_functions(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    classes_section = soup.find('p', string='Functions')
-    if classes_section:
-        table_container = classes_section.find_next('div', class_='pst-scrollable-table-container')
-        if table_container:
-            links = table_container.find_all('a', class_='reference internal')
-            hrefs = [link.get('href') for link in links if link.get('href')]
-            return hrefs
-    return []
+    return get_crawler().page(url).nav_hrefs
 
 def extract_description(content):
-    llm = ChatOllama(
-        model="mistral",
-        temperature=0.1,
-        device = "device",
-        # 생성 부분 추가
-        generation_kwargs={
-            "max_tokens": 4096,                 #max_tokens: 생성할 최대 토큰 수를 4096으로 설정합니다.
-            "top_p": 0.95,                      #top_p: 누적 확률 분포에서 상위 95%의 토큰만 고려합니다.
-            "top_k": 50,                        #top_k: 각 단계에서 가장 가능성 있는 50개의 토큰만 고려합니다.
-            "repeat_penalty": 1.1,              #repeat_penalty: 반복을 피하기 위해 이미 생성된 토큰에 1.1의 페널티를 적용합니다.
-            "stop": ["[INST]", "[/INST]"],      #stop: "[INST]"와 "[/INST]"를 만나면 생성을 중지합니다.
-        }
-    )
-
     prompt = f"[INST]This is a api reference content. Provide a brief description of the following content UNDER 35 words ,concisely:\n\n{content[:1000]}...[/INST]"   # need custom : content
-    return llm.invoke(prompt).content
+    return get_llm_pool().invoke(prompt)
     
 
 def extract_keywords(content):
-    llm = ChatOllama(
-        model="mistral",
-        temperature=0.1,
-        device = "device",
-        # 생성 부분 추가
-        generation_kwargs={
-            "max_tokens": 4096,                 #max_tokens: 생성할 최대 토큰 수를 4096으로 설정합니다.
-            "top_p": 0.95,                      #top_p: 누적 확률 분포에서 상위 95%의 토큰만 고려합니다.
-            "top_k": 50,                        #top_k: 각 단계에서 가장 가능성 있는 50개의 토큰만 고려합니다.
-            "repeat_penalty": 1.1,              #repeat_penalty: 반복을 피하기 위해 이미 생성된 토큰에 1.1의 페널티를 적용합니다.
-            "stop": ["[INST]", "[/INST]"],      #stop: "[INST]"와 "[/INST]"를 만나면 생성을 중지합니다.
-        }
-    )
     prompt = f"""[INST]
     You are a professional programmer's assistant. Please extract keywords based on the given content.
     FOLLOW THIS FORMAT : keyword1, keyword2, keyword3
@@ -207,15 +193,70 @@ def extract_keywords(content):
     This is a api reference content. Provide a list of keywords. It will be used for search and filter function, so need to be more granular and specific.:
     {content[:4000]}
     [/INST]"""   # need custom : content
-    return llm.invoke(prompt).content
+    return get_llm_pool().invoke(prompt)
 
 def extract_keywords_and_description(content):
-    description = extract_description(content)
+    # description, keywords 프롬프트를 동시에 실행
+    description_future = prompt_executor.submit(extract_description, content)
     keywords = extract_keywords(content)
-    return keywords, description
+    return keywords, description_future.result()
+
+def build_enrichment_prompt(contents):
+    pages = "\n\n".join(f"### page {i}\n{content[:enrichment_content_limit]}" for i, content in enumerate(contents, 1))
+    return f"""[INST]
+    You are a professional programmer's assistant. These are api reference contents.
+    For each page, provide a brief description UNDER 35 words, concisely, and a list of keywords.
+    The keywords will be used for search and filter function, so need to be more granular and specific.
+    Answer ONLY with a JSON array with one object per page, in the same order:
+    [{{"page": 1, "description": "...", "keywords": ["keyword1", "keyword2", "keyword3"]}}]
+
+    {pages}
+    [/INST]"""
+
+def parse_enrichment_response(response, count):
+    """
+    :return: 페이지 순서의 [(keywords, description) 또는 None]. 형식이 맞지 않는 페이지는 None
+    """
+    results = [None] * count
+    try:
+        pages = json.loads(response[response.find('['):response.rfind(']') + 1])
+    except ValueError:
+        return results
+    for i, page in enumerate(pages if isinstance(pages, list) else []):
+        if not isinstance(page, dict):
+            continue
+        position = page.get("page", i + 1)
+        description, keywords = page.get("description"), page.get("keywords")
+        if isinstance(position, int) and 1 <= position <= count and isinstance(description, str) and isinstance(keywords, (list, str)):
+            results[position - 1] = (keywords, description)
+    return results
+
+def enrichment_cache_key(content):
+    return f"{enrichment_prompt_version}:{content_checksum(content[:enrichment_content_limit])}"
+
+def enrich_contents(contents):
+    """
+    캐시에 없는 페이지만 하나의 JSON 프롬프트로 묶어 description과 keywords를 함께 추출한다.
+    :return: contents 순서의 [(keywords, description)]
+    """
+    cache = get_enrichment_cache()
+    keys = [enrichment_cache_key(content) for content in contents]
+    results = [cache.get(key) for key in keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    if todo:
+        response = get_llm_pool().invoke(build_enrichment_prompt([contents[i] for i in todo]))
+        for i, parsed in zip(todo, parse_enrichment_response(response, len(todo))):
+            if parsed is None:
+                # JSON 형식이 깨진 페이지는 기존 description, keywords 프롬프트로
+                parsed = extract_keywords_and_description(contents[i])
+            keywords, description = parsed
+            results[i] = [refine_keywords(keywords), description]
+            cache.set(keys[i], results[i])
+    return [tuple(result) for result in results]
 
 def refine_keywords(keywords):
-    keywords = keywords.split(',')
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
     # 키워드에서 따옴표 제거
     keywords = [keyword.strip().replace("'", "").replace('"', '') for keyword in keywords]
     # 중복 제거
@@ -224,78 +265,77 @@ def refine_keywords(keywords):
     keywords = [keyword for keyword in keywords if keyword not in unuseful_keywords]
     return keywords
 
-def get_description_and_keywords(id):
-    update_flag = True
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
-    cursor.execute("SELECT url, checksum, description, keywords FROM langchain_api_resource WHERE id = ?", (id,))
-    result = cursor.fetchone()
-    if result:
-        url, checksum, description, keywords = result
+def get_page_content(url):
+    return get_crawler().page(url).article_text
+
+def write_enrichment(id, keywords, description, meta):
+    checksum, etag, last_modified = meta
+    update_item(True, id, description=description, keywords=keywords, checksum=checksum, etag=etag, last_modified=last_modified)
+
+page_columns = ["id", "description", "keywords", "checksum", "etag", "last_modified"]
+
+def is_enriched(row):
+    id, description, keywords, checksum, etag, last_modified = row
+    return bool(description and keywords)
+
+def completed_future(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+def enrich_page(url, row):
+    """
+    description, keywords가 없거나 (incremental_refresh) 내용이 바뀐 페이지만 enrichment pipeline에 넣는다.
+    :param row: page_columns 순서의 DB 값
+    :return: ((keywords, description)으로 완료되는 Future, dirty 여부)
+    """
+    id, description, keywords, checksum, etag, last_modified = row
+    enriched = is_enriched(row)
+    stored = completed_future((keywords.split(',') if keywords else [], description))
+    if enriched and not incremental_refresh:
+        update_item(False, id)
+        return stored, False
+    if enriched:
+        response = get_crawler().fetch_response(url, etag, last_modified)
+        if response.not_modified:
+            update_item(False, id)
+            return stored, False
     else:
-        url, checksum, description, keywords = None, None, None, None
-    # Calculate checksum
-    
-    response = requests.get(url)
-    response.raise_for_status()
-    # new_checksum = get_checksum(url)
-    # if new_checksum == checksum:
-    #     if description and keywords:
-    #         update_flag = False
-    #         refined_keywords = keywords.split(',') if keywords else []
-    #         cursor.close()
-    #         return update_flag, refined_keywords, description
-    if description and keywords:
-        update_flag = False
-        refined_keywords = keywords.split(',') if keywords else []
-        cursor.close()
-        return update_flag, refined_keywords, description
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    bd_article = soup.find('article', class_='bd-article')    
-    # Use the readability library to extract the main body
-    # Now parse the main body using BeautifulSoup
-    # soup = BeautifulSoup(bd_article, 'html.parser')
-    content = bd_article.get_text(separator='\n', strip=True)
-    keywords, description = extract_keywords_and_description(content)
-    refined_keywords = refine_keywords(keywords)
-    cursor.close()
-    return update_flag, refined_keywords, description
-
-def integrate_descriptions(id, descriptions:list[str]) -> str:
+        response = get_crawler().fetch_response(url)
+    content = get_page_content(url)
+    new_checksum = content_checksum(content)
+    # etag IS NULL : checksum이 아직 기록된 적 없는 행, 이번 값을 기준으로 삼는다
+    if enriched and (new_checksum == checksum or etag is None):
+        update_validators(id, new_checksum, response.etag or '', response.last_modified or '')
+        update_item(False, id)
+        return stored, False
+    meta = (new_checksum, response.etag or '', response.last_modified or '')
+    return get_enrichment_pipeline().submit(id, content, meta), True
+
+def integrate_descriptions(id, descriptions:list[str], force=False) -> str:
     update_flag = True
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
-    cursor.execute("SELECT url, checksum, description FROM langchain_api_resource WHERE id = ?", (id,))
-    result = cursor.fetchone()
+    result = get_resource_db().execute("SELECT url, checksum, description FROM langchain_api_resource WHERE id = ?", (id,))
     if result:
-        url, checksum, description = result
+        url, checksum, description = result[0]
     else:
         url, checksum, description = None, None, None
     
-    response = requests.get(url)
-    response.raise_for_status()
-    
     # new_checksum = get_checksum(url)
     # if new_checksum == checksum and description is not None:
     #     update_flag = False
     #     return update_flag, description
-    if description and len(description) > 0:
+    if description and len(description) > 0 and not force:
         update_flag = False
         return update_flag, description
     
-    content = response.text
-    description = extract_description(content)
-    cursor.close()
+    # 본문 텍스트만 보낸다 (raw HTML 대신)
+    description = extract_description(get_page_content(url))
     return update_flag, description
 
-def integrate_keywords(id, keywords:list[list[str]]) -> list[str]:
+def integrate_keywords(id, keywords:list[list[str]], force=False) -> list[str]:
     update_flag = True
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
-    cursor.execute("SELECT keywords FROM langchain_api_resource WHERE id = ?", (id,))
-    keywords_db = cursor.fetchone()[0]
-    if keywords_db and len(keywords_db) > 0:
+    keywords_db = get_resource_db().execute("SELECT keywords FROM langchain_api_resource WHERE id = ?", (id,))[0][0]
+    if keywords_db and len(keywords_db) > 0 and not force:
         update_flag = False
         return update_flag, keywords_db.split(',')
     
@@ -303,61 +343,189 @@ def integrate_keywords(id, keywords:list[list[str]]) -> list[str]:
     unique_keywords = list(set(flat_keywords))
     return update_flag, unique_keywords
 
-def page_parse_add_update_loop(parent_url, parent_depth, parent_id):
-    base_url = parent_url.rsplit('/', 1)[0] + "/"
-    depth = parent_depth + 1
-    internal_category_hrefs = parse_page_get_internal_category_hrefs(parent_url)
-    internal_category_links = [base_url + href for href in internal_category_hrefs]
-    children_ids = []
-    children_descriptions = []
-    children_keywords = []
-    if len(internal_category_links) == 0:
-        # find classes 
-        classes = page_parse_get_classes(parent_url)
-        class_links = [base_url + href for href in classes]
-        for class_link in class_links:            
-            # id = add_item(class_link, get_checksum(class_link), "class", depth, parent_id)
-            id = get_item_from_url(class_link, ["id"])[0]
-            children_ids.append(id)
-            # get description and keywords
-            update_flag, keywords, description = get_description_and_keywords(id)
-            children_descriptions.append(description)
-            children_keywords.append(keywords)
-            update_item(update_flag, id, description=description, keywords=keywords)
-        # find functions 
-        functions = page_parse_get_functions(parent_url)
-        function_links = [base_url + href for href in functions]
-        for function_link in function_links:            
-            # id = add_item(function_link, get_checksum(function_link), "function", depth, parent_id)
-            id = get_item_from_url(function_link, ["id"])[0]
-            children_ids.append(id)
-            # get description and keywords
-            update_flag, keywords, description = get_description_and_keywords(id)
-            children_descriptions.append(description)
-            children_keywords.append(keywords)
-            update_item(update_flag, id, description=description, keywords=keywords)
-        pass 
+def frontier_item_id(url, type, depth, parent_url):
+    # frontier url의 리소스 행 id. 행이 없으면 만든다
+    parent = get_item_from_url(parent_url, ["id"]) if parent_url else None
+    return add_item(url, 0, type, depth, parent[0] if parent else 0)
+
+def discover_children(url, depth, id):
+    """
+    category 페이지의 하위 category 링크, 없으면 class/function 링크를 리소스 행과 frontier에 등록한다.
+    페이지의 checksum과 캐시 검증값도 여기서 기록하므로 통합(integrate_category) 때는 페이지를 다시 받지 않는다.
+    :return: 지난 크롤링 이후 이 페이지 내용이 바뀌었는지 (incremental_refresh)
+    """
+    checksum, etag, last_modified = get_item_from_url(url, ["checksum", "etag", "last_modified"])
+    # etag IS NULL : checksum이 아직 기록된 적 없는 행
+    if incremental_refresh and etag is not None:
+        response = get_crawler().fetch_response(url, etag, last_modified)
+        if response.not_modified:
+            # 바뀌지 않은 페이지는 지난 크롤링의 하위 목록을 그대로 다시 등록한다
+            children = get_resource_db().execute('''
+                SELECT r.url, r.type FROM resource_edge e JOIN langchain_api_resource r ON r.id = e.child_id
+                WHERE e.parent_id = ? ORDER BY e.position
+            ''', (id,))
+            if children:
+                get_resource_db().run(add_frontier_urls, url, [(link, type, depth + 1) for link, type in children])
+                return False
+    page = get_crawler().page(url)
+    response = get_crawler().fetch_response(url)
+    base_url = url.rsplit('/', 1)[0] + "/"
+    if page.category_hrefs:
+        children = [(base_url + href, "category") for href in page.category_hrefs]
     else:
-        for internal_category_link in internal_category_links:
-            # id = add_item(internal_category_link, get_checksum(internal_category_link), "category", depth, parent_id)            
-            id = get_item_from_url(internal_category_link, ["id"])[0]
-            page_parse_add_update_loop(internal_category_link, depth, id)
-            keywords = get_item_from_url(internal_category_link, ["keywords"])[0]
-            children_keywords.append(keywords.split(','))
-            if parent_depth == 1:
-                print(f"parent_id : {parent_id}\nintegrated_keywords : {children_keywords}")
-    # finish loop    
-    update_flag_description, integrated_description = integrate_descriptions(parent_id, children_descriptions)
-    update_flag_keywords, integrated_keywords = integrate_keywords(parent_id, children_keywords)
+        children = [(base_url + href, "class") for href in page.class_hrefs] + \
+                   [(base_url + href, "function") for href in page.function_hrefs]
+    children_ids = [add_item(link, 0, type, depth + 1, id) for link, type in children]
+    get_resource_db().run(set_resource_children, id, children_ids)
+    get_resource_db().run(add_frontier_urls, url, [(link, type, depth + 1) for link, type in children])
+    new_checksum = get_checksum(url)
+    update_validators(id, new_checksum, response.etag or '', response.last_modified or '')
+    return incremental_refresh and etag is not None and new_checksum != checksum
+
+def enrich_leaves(urls):
+    """
+    class/function 페이지를 enrichment pipeline에 넣는다.
+    :return: {url: (Future, dirty)}
+    """
+    child_rows = get_items_from_urls(urls, page_columns)
+    # 추출이 끝난 페이지는 incremental 모드에서만, 조건부 요청으로 받는다
+    get_crawler().prefetch(
+        [url for url in urls if incremental_refresh or not is_enriched(child_rows[url])],
+        {url: row[4:6] for url, row in child_rows.items() if is_enriched(row)},
+    )
+    futures = {}
+    for url in urls:
+        try:
+            futures[url] = enrich_page(url, child_rows[url])
+        except Exception as e:
+            failed = Future()
+            failed.set_exception(e)
+            futures[url] = (failed, False)
+    return futures
+
+def integrate_category(url, depth, id, dirty):
+    """
+    하위 url이 모두 끝난 category의 description/keywords를 통합한다.
+    :param dirty: 이 페이지(discover_children에서 확인)나 하위 페이지 중 새로 추출/통합한 것이 있는지
+    :return: 이 페이지나 하위 트리에서 새로 추출/통합한 내용이 있으면 True (dirty)
+    """
+    children_ids = [row[0] for row in get_resource_db().execute(
+        'SELECT child_id FROM resource_edge WHERE parent_id = ? ORDER BY position', (id,))]
+    children_keywords = get_children_keywords(children_ids)
+    # 부모 description/keywords는 하위 트리가 바뀐 경우에만 다시 통합한다. 본문은 description을 다시 만들 때만 받는다
+    update_flag_description, integrated_description = integrate_descriptions(id, [], force=dirty)
+    update_flag_keywords, integrated_keywords = integrate_keywords(id, children_keywords, force=dirty)
     update_flag = update_flag_description or update_flag_keywords
-    if parent_depth == 1:
-        print(f"parent_id : {parent_id}\nintegrated_keywords : {integrated_keywords}")
-    update_item(update_flag, parent_id, description=integrated_description, keywords=integrated_keywords, children_ids=children_ids)
+    if depth == 1:
+        print(f"parent_id : {id}\nintegrated_keywords : {integrated_keywords}")
+    update_item(update_flag, id, description=integrated_description, keywords=integrated_keywords, children_ids=children_ids)
+    return dirty or update_flag
+
+def process_frontier_round(owner):
+    """
+    frontier에서 url을 한 묶음 가져와 처리한다.
+    pending category -> 하위 url 등록 (fetched), pending class/function -> enrichment (enriched),
+    하위 url이 모두 끝난 fetched category -> 통합 (enriched)
+    :return: 가져간 url 수
+    """
+    db = get_resource_db()
+    rows = db.run(claim_frontier_urls, owner)
+    db.flush()    # lease를 다른 워커에게 바로 보이게 한다
+    leaves = []
+    discovered = set()
+    for url, parent_url, depth, type, state in rows:
+        try:
+            id = frontier_item_id(url, type, depth, parent_url)
+            if state == "fetched":
+                dirty = integrate_category(url, depth, id, db.read(frontier_dirty, url))
+                db.run(complete_frontier_url, url, "enriched", dirty)
+            elif type == "category":
+                changed = discover_children(url, depth, id)
+                db.run(complete_frontier_url, url, "fetched", changed)
+                discovered.add(url)
+            else:
+                leaves.append(url)
+        except Exception as e:
+            print(f"failed : {url}, {e!r}")
+            db.run(fail_frontier_url, url, repr(e))
+    for url, (future, dirty) in enrich_leaves(leaves).items():
+        try:
+            future.result()
+            db.run(complete_frontier_url, url, "enriched", dirty)
+        except Exception as e:
+            print(f"failed : {url}, {e!r}")
+            db.run(fail_frontier_url, url, repr(e))
+    # 하위 url을 등록한 category는 통합 때 본문이 필요할 수 있으므로 그때까지 남겨 둔다
+    get_crawler().forget([row[0] for row in rows if row[0] not in discovered])
+    db.flush()
+    return len(rows)
+
+def close_crawl_resources():
+    global crawler, resource_db, enrichment_pipeline
+    if enrichment_pipeline is not None:
+        enrichment_pipeline.close()
+    if resource_db is not None:
+        resource_db.close()
+    if crawler is not None:
+        crawler.close()
+    crawler, resource_db, enrichment_pipeline = None, None, None
 
-def process_category(category_link):
-    checksum = 0 #get_checksum(category_link)
-    id = add_item(category_link, checksum, "category", 1, 0)
-    page_parse_add_update_loop(category_link, 1, id)
+def run_frontier_worker(incremental=False):
+    """
+    frontier가 빌 때까지 처리한다. 여러 프로세스에서 동시에 실행할 수 있다.
+    다른 워커가 lease를 가진 url만 남았으면 끝나거나 lease가 만료될 때까지 기다린다.
+    """
+    global incremental_refresh
+    incremental_refresh = incremental
+    owner = frontier_worker_id()
+    try:
+        while True:
+            try:
+                if process_frontier_round(owner):
+                    continue
+                counts = get_resource_db().read(frontier_counts)
+            except sqlite3.OperationalError as e:
+                # 다른 워커가 busy timeout보다 오래 쓰기 lock을 잡은 경우. 이번 묶음의 url은 다음 claim에서 다시 가져간다
+                print(f"frontier round failed : {e!r}")
+                time.sleep(frontier_idle_interval)
+                continue
+            if not counts.get("pending") and not counts.get("fetched"):
+                break
+            get_resource_db().flush()     # 다른 워커가 기다리는 하위 url 상태를 바로 보이게 한다
+            time.sleep(frontier_idle_interval)
+    finally:
+        # 오류로 끝나도 가져간 url을 lease 만료까지 묶어 두지 않는다
+        try:
+            get_resource_db().run(release_frontier_leases, owner)
+        except Exception as e:
+            print(f"failed to release frontier leases : {e!r}")
+        close_crawl_resources()
+
+def seed_frontier(category_links):
+    get_resource_db().run(reset_frontier, [(link, "category", 1) for link in category_links])
+    get_resource_db().flush()
+
+def resume_frontier() -> bool:
+    """
+    끝나지 않은 크롤링이 있으면 이어서 처리하도록 준비한다.
+    중단된 실행의 워커는 이미 없으므로 lease 만료(frontier_lease_seconds)를 기다리지 않고 바로 다시 가져가게 lease를 푼다.
+    :return: 이어서 처리할 url이 있는지
+    """
+    counts = get_resource_db().read(frontier_counts)
+    if not (counts.get("pending") or counts.get("fetched")):
+        return False
+    get_resource_db().run(release_frontier_leases)
+    get_resource_db().flush()
+    print(f"resuming crawl : {counts}")
+    return True
+
+def prepare_frontier(restart=False):
+    if not restart and resume_frontier():
+        return
+    category_hrefs = get_category_hrefs(langchain_api_refer_url)
+    category_links = [langchain_api_refer_url_base + href for href in category_hrefs]
+    seed_frontier(category_links)
+    print(f"new crawl : {len(category_links)} categories")
 
 def print_update_cnt(id):
     print(f"update id : {id}, update cnt : {update_cnt}")
@@ -369,20 +537,30 @@ def print_update_cnt(id):
 
 
 if __name__ == '__main__':
-    conn = sqlite3.connect('langchain_api_resource.db', timeout=5)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM langchain_api_resource WHERE description IS NULL OR description = ""')
-    not_filled_description_number = cursor.fetchone()[0]
-    conn.close()
-    print(f"Not filled description number: {not_filled_description_number}")
-    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true', help='re-extract only pages changed since the last crawl')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes draining the crawl frontier')
+    parser.add_argument('--restart', action='store_true', help='discard an unfinished crawl and start over from all categories')
+    args = parser.parse_args()
+    incremental_refresh = args.incremental
+
     generate_langchain_api_resource_db()
+    not_filled_description_number = get_resource_db().execute('SELECT COUNT(*) FROM langchain_api_resource WHERE description IS NULL OR description = ""')[0][0]
+    print(f"Not filled description number: {not_filled_description_number}")
 
-    category_hrefs = get_category_hrefs(langchain_api_refer_url)
-    category_links = [langchain_api_refer_url_base + href for href in category_hrefs]    
-    for link in category_links[-1:]:
-        process_category(link)
-    # pool = multiprocessing.Pool()
-    # pool.starmap(process_category, [(link,) for link in category_links])
-    # pool.close()
-    # pool.join()
\ No newline at end of file
+    prepare_frontier(args.restart)
+    close_crawl_resources()     # 워커 프로세스는 자기 연결을 연다
+
+    if args.workers <= 1:
+        run_frontier_worker(incremental_refresh)
+    else:
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=run_frontier_worker, args=(incremental_refresh,)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    print(f"crawl frontier : {get_resource_db().read(frontier_counts)}")
+    close_crawl_resources()
+    # embeddings for the semantic retrieval mode, unchanged resources are not re-embedded
+    build_embedding_index()
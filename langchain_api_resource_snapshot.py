@@ -0,0 +1,213 @@
+import math
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from rapidfuzz import fuzz, process
+from langchain_api_cache import question_stopwords
+from langchain_api_metrics import count, span
+from langchain_api_keyword_index import get_trigrams, min_shared_trigrams, normalize_keyword, candidate_limit
+from langchain_api_resource_db import schema_migrations
+
+db_path = 'langchain_api_resource.db'
+snapshot_check_interval = 5     # seconds between revision watermark checks
+local_fuzzy_cutoff = 85         # 질문 토큰과 어휘 키워드의 최소 유사도 (오타, 복수형 등)
+# 질문에 흔히 붙지만 검색 대상은 아닌 단어. local keyword confidence 계산에서 뺀다
+generic_question_words = {"sample", "samples", "code", "example", "examples", "snippet", "tutorial", "guide",
+                          "docs", "documentation", "reference", "api", "langchain"}
+
+
+def read_watermark(conn):
+    # (update_item마다 오르는 revision, 행 수). updated_at은 초 단위라 같은 초 안의 변경을 놓친다
+    cursor = conn.cursor()
+    cursor.execute('SELECT (SELECT revision FROM resource_revision), COUNT(*) FROM langchain_api_resource')
+    return cursor.fetchone()
+
+
+class ResourceSnapshot:
+    """
+    langchain_api_resource 트리 전체를 메모리에 올린 읽기 전용 스냅샷.
+    리소스는 0부터 시작하는 position으로 참조하고, 속성은 position으로 인덱싱하는 배열에 담는다.
+    """
+    __slots__ = ('watermark', 'position', 'ids', 'urls', 'depths', 'children',
+                 'terms', 'term_position', 'resource_terms', 'term_resources', 'trigram_terms')
+
+    def __init__(self, conn, watermark):
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, url, depth FROM langchain_api_resource ORDER BY id')
+        rows = cursor.fetchall()
+        self.watermark = watermark
+        self.ids = array('q', (row[0] for row in rows))
+        self.position = {id: i for i, id in enumerate(self.ids)}
+        self.urls = [row[1] for row in rows]
+        self.depths = array('h', (row[2] or 0 for row in rows))
+        children = [[] for _ in rows]
+        cursor.execute('''
+            SELECT e.parent_id, e.child_id FROM resource_edge e
+            JOIN langchain_api_resource r ON r.id = e.child_id
+            ORDER BY e.parent_id, e.position
+        ''')
+        for parent_id, child_id in cursor.fetchall():
+            parent = self.position.get(parent_id)
+            if parent is not None:
+                children[parent].append(self.position[child_id])
+        self.children = [tuple(positions) for positions in children]
+
+        term_position = {}
+        resource_terms = [[] for _ in rows]
+        term_resources = []
+        cursor.execute('SELECT resource_id, keyword FROM resource_keyword')
+        for resource_id, keyword in cursor.fetchall():
+            i = self.position.get(resource_id)
+            if i is None:
+                continue
+            if keyword not in term_position:
+                term_position[keyword] = len(term_position)
+                term_resources.append([])
+            term = term_position[keyword]
+            resource_terms[i].append(term)
+            term_resources[term].append(i)
+        self.terms = list(term_position)
+        self.term_position = term_position
+        self.resource_terms = [array('i', terms) for terms in resource_terms]
+        self.term_resources = [array('i', resources) for resources in term_resources]
+
+        trigram_terms = {}
+        cursor.execute('SELECT trigram, keyword FROM keyword_trigram')
+        for trigram, keyword in cursor.fetchall():
+            term = term_position.get(keyword)
+            if term is not None:
+                trigram_terms.setdefault(trigram, array('i')).append(term)
+        self.trigram_terms = trigram_terms
+
+    def candidate_terms(self, keyword: str) -> list[int]:
+        trigrams = get_trigrams(normalize_keyword(keyword))
+        if not trigrams:
+            return []
+        min_shared = min_shared_trigrams(trigrams)
+        counts = Counter()
+        for trigram in trigrams:
+            counts.update(self.trigram_terms.get(trigram, ()))
+        return [term for term, count in counts.most_common(candidate_limit) if count >= min_shared]
+
+    def idf(self, term: int) -> float:
+        # BM25 idf
+        df = len(self.term_resources[term])
+        return math.log((len(self.ids) - df + 0.5) / (df + 0.5) + 1)
+
+    def match_term(self, phrase: str, fuzzy: bool = False):
+        term = self.term_position.get(phrase)
+        if term is None and ' ' in phrase:
+            term = self.term_position.get(phrase.replace(' ', ''))     # "usage metadata" -> usagemetadata
+        if term is None and fuzzy and len(phrase) >= 4:
+            terms = self.candidate_terms(phrase)
+            match = process.extractOne(phrase, [self.terms[t] for t in terms], scorer=fuzz.ratio, score_cutoff=local_fuzzy_cutoff)
+            if match is not None:
+                term = terms[match[2]]
+        return term
+
+    def local_keywords(self, question: str, limit: int = 10) -> tuple[list[str], float]:
+        """
+        LLM 없이 질문의 1~3-gram을 저장된 키워드 어휘와 맞춰 키워드를 뽑는다. BM25 idf가 높은 순으로 정렬.
+        :return: (키워드 목록, confidence = 어휘와 맞춰진 질문 내용 토큰의 비율)
+        """
+        tokens = re.findall(r'\w[\w\.]*', question.lower())
+        content = {i for i, token in enumerate(tokens) if token not in question_stopwords and token not in generic_question_words}
+        matched = {}
+        covered = set()
+        for size in (3, 2, 1):
+            for start in range(len(tokens) - size + 1):
+                token_span = set(range(start, start + size))
+                if token_span <= covered:
+                    continue
+                term = self.match_term(' '.join(tokens[start:start + size]), fuzzy=size == 1 and start in content)
+                if term is not None:
+                    matched[term] = self.idf(term)
+                    covered |= token_span
+        if not content:
+            return [], 0.0
+        keywords = sorted(matched, key=matched.get, reverse=True)[:limit]
+        return [self.terms[term] for term in keywords], len(covered & content) / len(content)
+
+    def candidates(self, keywords: list[str], depth: int = None) -> dict[int, list[str]]:
+        """
+        keyword_trigram 색인과 같은 규칙으로 메모리에서 후보를 찾는다.
+        :return: {position: 리소스의 전체 키워드 목록}
+        """
+        candidate_terms = set()
+        for keyword in keywords:
+            candidate_terms.update(self.candidate_terms(keyword))
+        positions = {i for term in candidate_terms for i in self.term_resources[term]
+                     if depth is None or self.depths[i] == depth}
+        count("candidate_resources_total", len(positions))
+        return self.resource_keywords(positions)
+
+    def resource_keywords(self, positions) -> dict[int, list[str]]:
+        return {i: [self.terms[term] for term in self.resource_terms[i]] for i in positions}
+
+
+resource_snapshot = None
+snapshot_checked_at = 0.0
+snapshot_lock = threading.Lock()
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def check_schema_version(conn):
+    # migration은 크롤러(langchain_api_resource_manager)만 실행한다. 조회 서비스는 읽기만 한다
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < len(schema_migrations):
+        raise SchemaVersionError(f"{db_path} schema version {version} is older than {len(schema_migrations)}, "
+                                 f"run langchain_api_resource_manager.py to migrate it")
+
+
+def load_resource_snapshot() -> ResourceSnapshot:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+    try:
+        with span("snapshot_load"):
+            check_schema_version(conn)
+            snapshot = ResourceSnapshot(conn, read_watermark(conn))
+    finally:
+        conn.close()
+    count("snapshot_loads_total")
+    count("snapshot_rows_loaded_total", len(snapshot.ids))
+    return snapshot
+
+
+def get_resource_snapshot() -> ResourceSnapshot:
+    """
+    현재 스냅샷을 반환한다. snapshot_check_interval 마다 백그라운드 스레드 하나가 revision 워터마크를 확인하고,
+    바뀌었으면 새 스냅샷을 만든 뒤 참조를 통째로 교체한다. 다시 만드는 동안에도 요청은 이전 스냅샷으로 바로 처리된다.
+    """
+    global resource_snapshot, snapshot_checked_at
+    if resource_snapshot is None:
+        with snapshot_lock:
+            if resource_snapshot is None:
+                resource_snapshot = load_resource_snapshot()
+                snapshot_checked_at = time.monotonic()
+        return resource_snapshot
+    if time.monotonic() - snapshot_checked_at >= snapshot_check_interval and snapshot_lock.acquire(blocking=False):
+        snapshot_checked_at = time.monotonic()
+        threading.Thread(target=reload_resource_snapshot, name="snapshot-reload", daemon=True).start()
+    return resource_snapshot
+
+
+def reload_resource_snapshot():
+    # snapshot_lock을 잡은 get_resource_snapshot이 시작한다. 끝나면 lock을 푼다
+    global resource_snapshot
+    try:
+        conn = sqlite3.connect(db_path, timeout=5)
+        try:
+            watermark = read_watermark(conn)
+        finally:
+            conn.close()
+        if watermark != resource_snapshot.watermark:
+            resource_snapshot = load_resource_snapshot()
+    except Exception as e:
+        print(f"snapshot reload failed, keep serving the current snapshot : {e!r}")
+    finally:
+        snapshot_lock.release()
@@ -0,0 +1,77 @@
+import functools
+import os
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 모듈들이 repo 최상위에 있고, 테스트는 stub LLM과 메모리 키워드 캐시로 실행한다
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["KEYWORD_CACHE_DB"] = ""
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+
+# API reference 구조를 줄인 사이트 : category -> sub category -> class/function
+fixture_pages = {
+    "cat.html": "<h1>core</h1><p>Core module</p>"
+                "<a class='reference internal' href='sub.html'><span class='std std-ref'>Messages</span></a>",
+    "sub.html": "<h1>messages</h1><p>Classes</p><div class='pst-scrollable-table-container'>"
+                "<a class='reference internal' href='cls1.html'>UsageMetadata</a>"
+                "<a class='reference internal' href='cls2.html'>AIMessage</a></div>"
+                "<p>Functions</p><div class='pst-scrollable-table-container'>"
+                "<a class='reference internal' href='fn1.html'>merge_content</a></div>",
+    "cls1.html": "<h1>UsageMetadata</h1><p>Usage metadata for a message, input_tokens and output_tokens</p>",
+    "cls2.html": "<h1>AIMessage</h1><p>Message from an AI model with tool_calls and usage_metadata</p>",
+    "fn1.html": "<h1>merge_content</h1><p>Merge two message contents together</p>",
+}
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    # server.requests : [(path, monotonic time)] 받은 GET 요청
+    # server.failures : {path: 남은 횟수} 이 횟수만큼 503을 먼저 돌려준다 (재시도 확인용)
+    def do_GET(self):
+        self.server.requests.append((self.path, time.monotonic()))
+        if self.server.failures.get(self.path, 0) > 0:
+            self.server.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fixture_server(tmp_path):
+    # 로컬 HTTP 서버로 fixture_pages를 제공한다. base_url 속성에 주소가 있다
+    directory = tmp_path / "site"
+    directory.mkdir()
+    for name, body in fixture_pages.items():
+        (directory / name).write_text("<html><body><header>langchain</header>"
+                                      f"<article class='bd-article'>{body}</article><footer>footer</footer></body></html>")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(FixtureHandler, directory=str(directory)))
+    server.requests = []
+    server.failures = {}
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def fixture_site(fixture_server):
+    # :return: base url
+    return fixture_server.base_url
+
+
+@pytest.fixture
+def crawl_dir(tmp_path, monkeypatch):
+    # 모듈들은 현재 디렉터리의 기본 db 경로를 쓴다
+    import langchain_api_resource_manager as manager
+    monkeypatch.chdir(tmp_path)
+    manager.generate_langchain_api_resource_db()
+    yield tmp_path
+    manager.close_crawl_resources()
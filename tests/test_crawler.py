@@ -0,0 +1,47 @@
+from collections import Counter
+
+import langchain_api_crawler
+import langchain_api_resource_manager as manager
+from conftest import fixture_pages
+from langchain_api_crawler import Crawler
+
+
+def test_full_crawl_downloads_and_parses_each_page_once(fixture_server, crawl_dir, monkeypatch):
+    parsed = Counter()
+    parse_page = langchain_api_crawler.parse_page
+
+    def count_parse(url, html):
+        parsed[url] += 1
+        return parse_page(url, html)
+
+    monkeypatch.setattr(langchain_api_crawler, "parse_page", count_parse)
+    manager.seed_frontier([fixture_server.base_url + "cat.html"])
+    manager.run_frontier_worker()
+
+    downloads = Counter(path for path, _ in fixture_server.requests)
+    assert downloads == Counter({"/" + name: 1 for name in fixture_pages})
+    assert sorted(parsed.values()) == [1] * len(fixture_pages)
+
+
+def test_retries_server_errors(fixture_server):
+    fixture_server.failures["/cls1.html"] = 2
+    crawler = Crawler(host_interval=0)
+    try:
+        assert "UsageMetadata" in crawler.fetch(fixture_server.base_url + "cls1.html")
+    finally:
+        crawler.close()
+    assert [path for path, _ in fixture_server.requests] == ["/cls1.html"] * 3
+
+
+def test_requests_to_one_host_are_spaced(fixture_server):
+    crawler = Crawler(max_workers=4, host_interval=0.1)
+    try:
+        crawler.prefetch([fixture_server.base_url + name for name in fixture_pages])
+        for name in fixture_pages:
+            crawler.fetch(fixture_server.base_url + name)
+    finally:
+        crawler.close()
+    times = sorted(at for _, at in fixture_server.requests)
+    assert len(times) == len(fixture_pages)
+    # 동시 다운로드 4개여도 같은 호스트로는 host_interval 간격으로 보낸다 (타이머 오차 허용)
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.09
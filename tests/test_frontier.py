@@ -0,0 +1,151 @@
+import multiprocessing
+import sqlite3
+import time
+
+import langchain_api_resource_manager as manager
+from langchain_api_frontier import (add_frontier_urls, claim_frontier_urls, create_crawl_frontier_table, frontier_counts,
+                                    frontier_lease_seconds, frontier_max_attempts, release_frontier_leases)
+from langchain_api_resource_db import ResourceDB
+
+
+def add_urls(path, urls):
+    db = ResourceDB(path)
+    db.run(add_frontier_urls, None, urls)
+    db.close()
+
+
+def run_in_process(target, *args):
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+def test_write_after_read_sees_other_process_commits(tmp_path):
+    # 읽기가 트랜잭션을 열어 두면 다른 프로세스의 commit 뒤 쓰기가 'database is locked'로 실패한다
+    path = str(tmp_path / "frontier.db")
+    conn = sqlite3.connect(path)
+    create_crawl_frontier_table(conn)
+    conn.close()
+    db = ResourceDB(path)
+    assert db.read(frontier_counts) == {}
+
+    run_in_process(add_urls, path, [("https://example.invalid/a.html", "category", 1),
+                                    ("https://example.invalid/b.html", "class", 2)])
+
+    assert db.read(frontier_counts) == {"pending": 2}
+    rows = db.run(claim_frontier_urls, "worker")
+    db.close()
+    assert sorted(row[0] for row in rows) == ["https://example.invalid/a.html", "https://example.invalid/b.html"]
+
+
+def write_url_with_short_timeout(path, url):
+    conn = sqlite3.connect(path, timeout=1)
+    add_frontier_urls(conn, None, [(url, "class", 2)])
+    conn.commit()
+    conn.close()
+
+
+def test_writes_do_not_hold_the_lock_between_calls(tmp_path):
+    # 워커가 네트워크/LLM을 기다리는 동안 쓰기 트랜잭션이 열려 있으면 다른 워커의 쓰기가 busy timeout으로 실패한다
+    path = str(tmp_path / "frontier.db")
+    conn = sqlite3.connect(path)
+    create_crawl_frontier_table(conn)
+    conn.close()
+    db = ResourceDB(path)
+    db.run(add_frontier_urls, None, [("a", "class", 2)])
+    db.write("UPDATE crawl_frontier SET dirty = 1 WHERE url = ?", ("a",))
+    db.execute("UPDATE crawl_frontier SET attempts = 1 WHERE url = 'a'")
+    assert not db.conn.in_transaction
+
+    run_in_process(write_url_with_short_timeout, path, "b")
+    assert db.read(frontier_counts) == {"pending": 2}
+    db.close()
+
+
+def frontier_states():
+    conn = sqlite3.connect("langchain_api_resource.db")
+    states = dict(conn.execute("SELECT url, state FROM crawl_frontier").fetchall())
+    conn.close()
+    return states
+
+
+def test_claim_leases(tmp_path):
+    conn = sqlite3.connect(tmp_path / "frontier.db", isolation_level=None)
+    create_crawl_frontier_table(conn)
+    add_frontier_urls(conn, None, [("cat", "category", 1), ("a", "class", 2), ("b", "class", 2)])
+
+    # 깊은 url부터, 다른 워커가 lease를 가진 url은 가져가지 않는다
+    assert sorted(row[0] for row in claim_frontier_urls(conn, "w1", limit=2)) == ["a", "b"]
+    assert [row[0] for row in claim_frontier_urls(conn, "w2")] == ["cat"]
+    assert claim_frontier_urls(conn, "w3") == []
+    # 중단된 묶음의 자기 lease는 만료 전이라도 다시 가져간다
+    assert [row[0] for row in claim_frontier_urls(conn, "w2")] == ["cat"]
+
+    # 만료된 lease는 다른 워커가 가져가고, 시도 횟수를 다 쓰면 failed
+    conn.execute("UPDATE crawl_frontier SET lease_expires = 0 WHERE url = 'a'")
+    assert [row[0] for row in claim_frontier_urls(conn, "w3")] == ["a"]
+    conn.execute("UPDATE crawl_frontier SET lease_expires = 0 WHERE url = 'a'")
+    assert claim_frontier_urls(conn, "w4", max_attempts=2) == []
+    assert frontier_counts(conn) == {"failed": 1, "pending": 2}
+
+    release_frontier_leases(conn, "w1")
+    assert [row[0] for row in claim_frontier_urls(conn, "w3")] == ["b"]
+
+
+def test_resumed_crawl_keeps_the_retry_cap(tmp_path):
+    # 워커를 죽게 만드는 url : 가져간 뒤 끝내지 못하고, 재개할 때마다 lease가 풀린다
+    conn = sqlite3.connect(tmp_path / "frontier.db", isolation_level=None)
+    create_crawl_frontier_table(conn)
+    add_frontier_urls(conn, None, [("crash", "class", 2)])
+    for _ in range(frontier_max_attempts):
+        assert [row[0] for row in claim_frontier_urls(conn, "dead")] == ["crash"]
+        release_frontier_leases(conn)
+    assert claim_frontier_urls(conn, "w") == []
+    assert conn.execute("SELECT state, attempts, error FROM crawl_frontier").fetchall() == [
+        ("failed", frontier_max_attempts, "attempts exhausted")]
+
+
+def test_crawl_fixture_site(fixture_site, crawl_dir):
+    manager.seed_frontier([fixture_site + "cat.html"])
+    manager.run_frontier_worker()
+
+    assert set(frontier_states().values()) == {"enriched"}
+    conn = sqlite3.connect("langchain_api_resource.db")
+    rows = {url.rsplit("/", 1)[1]: (description, keywords, children_ids) for url, description, keywords, children_ids in
+            conn.execute("SELECT url, description, keywords, children_ids FROM langchain_api_resource")}
+    conn.close()
+    assert set(rows) == {"cat.html", "sub.html", "cls1.html", "cls2.html", "fn1.html"}
+    assert all(description and keywords for description, keywords, _ in rows.values())
+    assert len(rows["sub.html"][2].split(",")) == 3
+
+
+def test_resume_releases_dead_worker_leases(fixture_site, crawl_dir):
+    manager.seed_frontier([fixture_site + "cat.html"])
+    # 중단된 실행의 워커가 lease를 가진 채 죽은 상태
+    manager.get_resource_db().run(claim_frontier_urls, "dead-host:1")
+    manager.close_crawl_resources()
+
+    assert manager.resume_frontier()
+    start = time.monotonic()
+    manager.run_frontier_worker()
+    assert time.monotonic() - start < frontier_lease_seconds
+    assert set(frontier_states().values()) == {"enriched"}
+    assert not manager.resume_frontier()
+
+
+def test_multiple_worker_processes(fixture_site, crawl_dir, monkeypatch):
+    # 느린 LLM을 기다리는 동안에도 다른 워커의 쓰기를 막지 않아야 한다 ('database is locked'로 죽지 않음)
+    monkeypatch.setenv("LLM_STUB_LATENCY", "0.5")
+    manager.seed_frontier([fixture_site + "cat.html"])
+    manager.close_crawl_resources()
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=manager.run_frontier_worker) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(120)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert len(frontier_states()) == 5
+    assert set(frontier_states().values()) == {"enriched"}
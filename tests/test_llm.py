@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from langchain_api_llm import LLMClientPool, StubLLM
+
+
+class SlowPromptLLM(StubLLM):
+    # "slow" 프롬프트만 latency 만큼 걸린다
+    def invoke(self, prompt):
+        if prompt == "slow":
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt):
+        if prompt == "slow":
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+
+def single_slot_pool(latency: float) -> LLMClientPool:
+    pool = LLMClientPool(size=1)
+    pool.clients = [SlowPromptLLM(latency=latency)]
+    return pool
+
+
+def test_ainvoke_timeout_includes_waiting_for_a_slot():
+    pool = single_slot_pool(latency=1.0)
+
+    async def saturate():
+        first = asyncio.ensure_future(pool.ainvoke("slow"))
+        await asyncio.sleep(0.05)
+        pool.timeout = 0.3
+        start = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.ainvoke("fast")
+        waited = time.perf_counter() - start
+        await first
+        return waited
+
+    assert asyncio.run(saturate()) < 0.6
+
+
+def test_sync_and_async_calls_share_one_limit():
+    pool = single_slot_pool(latency=0.5)
+    thread = threading.Thread(target=pool.invoke, args=("slow",))
+    thread.start()
+    time.sleep(0.05)
+    # 동기 호출이 slot을 쓰는 동안 비동기 호출은 기다린다
+    start = time.perf_counter()
+    assert asyncio.run(pool.ainvoke("fast"))
+    assert time.perf_counter() - start > 0.3
+    thread.join()
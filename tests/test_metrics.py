@@ -0,0 +1,29 @@
+import contextvars
+import threading
+import time
+
+from langchain_api_metrics import span, start_request_stages
+
+
+def test_nested_spans_are_not_double_counted():
+    stages = start_request_stages()
+    start = time.perf_counter()
+    with span("outer"):
+        time.sleep(0.05)
+        with span("inner"):
+            time.sleep(0.1)
+        # 복사된 context로 실행되는 워커 스레드의 span도 바깥 span에서 빠진다
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(nested_in_thread,))
+        thread.start()
+        thread.join()
+    total = time.perf_counter() - start
+
+    assert 0.04 < stages["outer"] < 0.09
+    assert stages["inner"] >= 0.1
+    assert stages["thread"] >= 0.1
+    assert sum(stages.values()) <= total
+
+
+def nested_in_thread():
+    with span("thread"):
+        time.sleep(0.1)
@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+import langchain_api_keyword_index
+from langchain_api_resource_db import migrate_schema, schema_migrations
+
+
+def create_legacy_db(path, rows):
+    # migration 이전(user_version 0)의 langchain_api_resource 테이블
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE langchain_api_resource (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            description TEXT,
+            checksum INTEGER NOT NULL,
+            keywords TEXT,
+            type TEXT,
+            depth INTEGER,
+            parent_id INTEGER,
+            children_ids TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany('INSERT INTO langchain_api_resource (url, checksum, keywords, type, depth, parent_id) VALUES (?, 0, ?, ?, 2, 0)',
+                     [(f"https://example.invalid/{i}.html", f"keyword{i},shared", "class") for i in range(rows)])
+    conn.commit()
+    return conn
+
+
+def test_interrupted_migration_is_applied_again(tmp_path, monkeypatch):
+    conn = create_legacy_db(tmp_path / "resource.db", 100)
+    index_resource_keywords = langchain_api_keyword_index.index_resource_keywords
+    indexed = 0
+
+    def interrupt_after_30(conn, resource_id, keywords):
+        nonlocal indexed
+        indexed += 1
+        if indexed > 30:
+            raise KeyboardInterrupt
+        index_resource_keywords(conn, resource_id, keywords)
+
+    monkeypatch.setattr(langchain_api_keyword_index, "index_resource_keywords", interrupt_after_30)
+    with pytest.raises(KeyboardInterrupt):
+        migrate_schema(conn)
+    # 키워드 색인 migration(3번째)은 user_version과 함께 되돌려진다
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 2
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'resource_keyword'").fetchone() is None
+
+    monkeypatch.setattr(langchain_api_keyword_index, "index_resource_keywords", index_resource_keywords)
+    migrate_schema(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(schema_migrations)
+    assert conn.execute('SELECT COUNT(DISTINCT resource_id) FROM resource_keyword').fetchone()[0] == 100
+    conn.close()
@@ -0,0 +1,17 @@
+import sqlite3
+
+import langchain_api_resource_manager as manager
+from langchain_api_resource_snapshot import read_watermark
+
+
+def test_watermark_changes_for_updates_within_the_same_second(crawl_dir):
+    id = manager.add_item("https://example.invalid/a.html", 0, "class", 2, 0)
+    manager.get_resource_db().flush()
+    conn = sqlite3.connect("langchain_api_resource.db")
+    watermarks = [read_watermark(conn)]
+    for keywords in (["chat"], ["chat", "model"], ["model"]):
+        manager.update_item(True, id, keywords=keywords)
+        manager.get_resource_db().flush()
+        watermarks.append(read_watermark(conn))
+    conn.close()
+    assert len(set(watermarks)) == len(watermarks)